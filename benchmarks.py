@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+import numpy as np
+import argparse
+import sys
+import time
+
+def _rate(n, seconds):
+    return n / max(seconds, 1e-12)
+
+def _per_sample_echo_block(echo_block):
+    """Meteor Echo Simulator block running the per-sample loop work() used to run"""
+    class blk(echo_block.blk):
+        def work(self, input_items, output_items):
+            inp = input_items[0]
+            out = output_items[0]
+            n   = len(inp)
+            start = self.nitems_written(0)
+
+            for i in range(n):
+                # Countdown to next meteor
+                self._next_event -= 1
+                if self._next_event <= 0:
+                    self._new_meteor()
+                    self._announce(start + i)
+                    self._next_event = self._draw_interval()
+
+                # Build modulating phasor: envelope × Doppler
+                mod = self._env * np.exp(1j * self._phase)
+                out[i] = inp[i] * mod
+
+                # Decay the envelope, advance the phase
+                self._env   *= self._decay
+                self._phase += self._dphi
+
+            return n
+    return blk
+
+def bench_echo_block(n_samples=480000, block_size=8192, samp_rate=48000,
+                     avg_rate=3600.0, seed=1234):
+    """
+    Compare the vectorized and per-sample work() of the Meteor Echo Simulator
+    block on the same input and RNG seed. Each runs in its own flowgraph
+    (vector_source -> block -> vector_sink), since work() tags onsets
+    through the block_detail a connected block has.
+    """
+    from gnuradio import gr, blocks
+    import echoSim_epy_block_0 as echo_block
+
+    variants = {'work_per_sample': _per_sample_echo_block(echo_block), 'work': echo_block.blk}
+    rng = np.random.default_rng(seed)
+    inp = (rng.standard_normal(n_samples) +
+           1j * rng.standard_normal(n_samples)).astype(np.complex64)
+
+    results = {}
+    outputs = {}
+    for name, block_cls in variants.items():
+        blk = block_cls(samp_rate=samp_rate, avg_rate=avg_rate,
+                        tau_min=0.05, tau_max=0.8,
+                        doppler_max=400.0, snr_db=15.0, seed=seed)
+        src = blocks.vector_source_c(inp, False)
+        sink = blocks.vector_sink_c()
+        tb = gr.top_block()
+        tb.connect(src, blk, sink)
+
+        start = time.perf_counter()
+        tb.run(block_size)
+        results[name] = _rate(n_samples, time.perf_counter() - start)
+        outputs[name] = np.array(sink.data(), dtype=np.complex64)
+
+    identical = np.array_equal(outputs['work'], outputs['work_per_sample'])
+    print(f"Meteor Echo Simulator block ({n_samples} samples, "
+          f"at most {block_size} samples per work() call)")
+    print(f"  per-sample loop: {results['work_per_sample']:14.0f} samples/s")
+    print(f"  vectorized:      {results['work']:14.0f} samples/s")
+    print(f"  speedup: {results['work'] / results['work_per_sample']:.1f}x, "
+          f"identical output: {identical}")
+    return results
+
+def _stft_per_frame(audio_data, nfft, hop_length):
+    """Per-frame STFT loop that create_spectrogram used to run"""
+    window = np.hanning(nfft)
+    n_frames = 1 + (len(audio_data) - nfft) // hop_length
+    spectrogram = np.zeros((nfft // 2 + 1, n_frames))
+    for i in range(n_frames):
+        start = i * hop_length
+        spectrogram[:, i] = np.abs(np.fft.rfft(audio_data[start:start + nfft] * window))
+    return 20 * np.log10(spectrogram + 1e-10)
+
+def bench_spectrogram(filename='epsilon_echo_1.wav', nfft=2048, overlap=0.8, repeats=3):
+    """
+    Compare the batched STFT of EpsilonSpectrogramVisualizer with the
+    per-frame loop on a WAV file
+    """
+    from epsilon_visualizer import EpsilonSpectrogramVisualizer
+
+    visualizer = EpsilonSpectrogramVisualizer()
+    audio_data, sample_rate = visualizer.read_wav_file(filename)
+    hop_length = int(nfft * (1 - overlap))
+
+    def best_of(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    t_loop, ref = best_of(lambda: _stft_per_frame(audio_data, nfft, hop_length))
+    t_f64, (spec64, _, _) = best_of(lambda: visualizer.create_spectrogram(
+        audio_data, sample_rate, nfft=nfft, overlap=overlap))
+    t_f32, (spec32, _, _) = best_of(lambda: visualizer.create_spectrogram(
+        audio_data, sample_rate, nfft=nfft, overlap=overlap, dtype=np.float32))
+
+    n = len(audio_data)
+    print(f"Spectrogram of {filename} ({n} samples, nfft={nfft}, overlap={overlap})")
+    print(f"  per-frame loop:   {_rate(n, t_loop):14.0f} samples/s")
+    print(f"  batched float64:  {_rate(n, t_f64):14.0f} samples/s "
+          f"({t_loop / t_f64:.1f}x, max |diff| {np.max(np.abs(spec64 - ref)):.2e} dB)")
+    print(f"  batched float32:  {_rate(n, t_f32):14.0f} samples/s "
+          f"({t_loop / t_f32:.1f}x, max |diff| {np.max(np.abs(spec32 - ref)):.2e} dB)")
+
+def bench_render(filename='epsilon_echo_1.wav', n_files=5):
+    """
+    Time PNG output of a precomputed spectrogram: a fresh pyplot figure per
+    file, the reused off-screen SpectrogramRenderer, and a bare image
+    """
+    import os
+    import tempfile
+    import rendering
+    rendering.select_backend(headless=True)
+    import matplotlib.pyplot as plt
+    from epsilon_visualizer import EpsilonSpectrogramVisualizer
+
+    visualizer = EpsilonSpectrogramVisualizer()
+    audio_data, sample_rate = visualizer.read_wav_file(filename, lazy=True)
+    spec, t, f = visualizer.create_spectrogram(audio_data, sample_rate, nfft=2048, overlap=0.8)
+    renderer = rendering.SpectrogramRenderer()
+
+    def fresh_figure(path):
+        visualizer.plot_spectrogram(spec, t, f, filename).savefig(path, dpi=150, bbox_inches='tight')
+        plt.close()
+
+    paths = {
+        'fresh pyplot figure': fresh_figure,
+        'reused renderer': lambda path: renderer.render(spec, t, f, filename, path),
+        'bare image': lambda path: rendering.save_spectrogram_image(path, spec, f, fmax=5000),
+    }
+    print(f"PNG rendering of {filename} spectrogram ({spec.shape[1]} frames), {n_files} files")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, render in paths.items():
+            start = time.perf_counter()
+            for i in range(n_files):
+                render(os.path.join(tmp, f"{i}.png"))
+            per_file = (time.perf_counter() - start) / n_files
+            print(f"  {name:20s} {per_file * 1000:8.1f} ms/file")
+
+def _worst_spur_dbc(x):
+    """Largest non-carrier FFT bin relative to the carrier, in dBc"""
+    spectrum = np.abs(np.fft.fft(x.astype(np.complex128)))
+    carrier = np.argmax(spectrum)
+    peak = spectrum[carrier]
+    spectrum[carrier] = 0.0
+    return 20 * np.log10(np.max(spectrum) / peak + 1e-300)
+
+def bench_nco(n_samples=1 << 20, samp_rate=48000, repeats=3):
+    """
+    Throughput and spectral purity of the NCO against evaluating np.exp/np.sin
+    of a full-length float64 phase array
+    """
+    from nco import NCO
+
+    # A bin-centred carrier, so every other FFT bin is a spur, not leakage
+    freq = samp_rate * 12345 / n_samples
+    k = np.arange(n_samples)
+    freqs = np.full(n_samples, freq)
+
+    def best_of(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    cases = {
+        'np.exp(1j*phase)':       lambda: np.exp(1j * 2 * np.pi * freq * k / samp_rate),
+        'NCO rotation':           lambda: NCO(samp_rate, freq).complex(n_samples),
+        'np.sin(phase)':          lambda: np.sin(2 * np.pi * np.cumsum(freqs) / samp_rate),
+        'NCO table, per-sample f': lambda: NCO(samp_rate).sin(freq=freqs),
+    }
+    print(f"Oscillators ({n_samples} samples, carrier {freq:.2f} Hz)")
+    for name, fn in cases.items():
+        seconds, x = best_of(fn)
+        if not np.iscomplexobj(x):
+            x = np.fft.ifft(np.fft.fft(x) * (np.fft.fftfreq(n_samples) > 0))  # analytic signal
+        print(f"  {name:24s} {_rate(n_samples, seconds):14.0f} samples/s, "
+              f"worst spur {_worst_spur_dbc(x):7.1f} dBc ({x.dtype})")
+
+def check_models(samp_rate=48000, tau=0.3, doppler=250.0, seconds=2.0):
+    """
+    Check the per-sample recurrences the echo block runs against the
+    closed-form envelope and Doppler phase the offline simulator uses
+    """
+    import echo_models
+
+    n = int(seconds * samp_rate)
+    t = np.arange(n) / samp_rate
+    env = echo_models.recursive_envelope(1.0, np.exp(-1.0 / (tau * samp_rate)), n)
+    phase = echo_models.recursive_phase(0.0, 2 * np.pi * doppler / samp_rate, n)
+    offline = echo_models.underdense_envelope(t, tau) * np.exp(1j * echo_models.doppler_phase(t, doppler, 0.0, 0.0))
+    realtime = env * np.exp(1j * phase)
+    print(f"Echo block vs offline model ({n} samples, tau={tau}s, doppler={doppler}Hz)")
+    print(f"  max |envelope diff|: {np.max(np.abs(env - echo_models.underdense_envelope(t, tau))):.2e}")
+    print(f"  max |signal diff|:   {np.max(np.abs(realtime - offline)):.2e}")
+
+def bench_arrivals(rate_per_hour=3600.0, days=2.0, seed=1234):
+    """
+    Time drawing a long run of meteor onsets one gap at a time against the
+    bulk cumsum of poisson_arrivals, and a diurnal profile by thinning
+    """
+    import echo_models
+
+    rate = rate_per_hour / 3600.0
+    T = days * 86400.0
+
+    def one_at_a_time(rng):
+        times = []
+        t = rng.exponential(1.0 / rate)
+        while t < T:
+            times.append(t)
+            t += rng.exponential(1.0 / rate)
+        return np.array(times)
+
+    diurnal_fn, diurnal_max = echo_models.diurnal_rate(rate)
+    cases = {
+        'one gap at a time': one_at_a_time,
+        'bulk cumsum': lambda rng: echo_models.poisson_arrivals(rate, T, rng),
+        'diurnal, thinned': lambda rng: echo_models.thinned_arrivals(diurnal_fn, diurnal_max, T, rng),
+    }
+    print(f"Poisson arrivals ({rate_per_hour:.0f}/h over {days:g} days)")
+    for name, fn in cases.items():
+        start = time.perf_counter()
+        times = fn(np.random.default_rng(seed))
+        seconds = time.perf_counter() - start
+        print(f"  {name:20s} {len(times):8d} onsets, {_rate(len(times), seconds):14.0f} onsets/s")
+
+def check_dtype(tolerance=1e-5, seed=1234):
+    """
+    Run each offline generator in float32 and float64 from the same seed,
+    without noise so the two runs see the same draws, and compare: worst
+    sample error relative to the float64 peak, and peak traced memory.
+    Returns False if any error is above tolerance.
+    """
+    import tracemalloc
+    import meteor_ping
+    import meteor_ping_spectrograms
+    import meteor_ping_simulator
+    from epsilon_simulator import EpsilonMeteorSimulator
+
+    def simulator_run(dtype):
+        cfg = meteor_ping_simulator.SimConfig(dur_s=60.0, event_rate_hz=5.0, dtype=dtype)
+        N = int(cfg.fs * cfg.dur_s)
+        x = np.zeros(N, dtype=cfg.dtype)
+        for ev in meteor_ping_simulator.draw_events(cfg, N, np.random.default_rng(seed)):
+            meteor_ping_simulator.render_event(cfg, ev, x)
+        return x
+
+    pings = np.zeros(20, dtype=meteor_ping_spectrograms.PING_PARAMS_DTYPE)
+    rng = np.random.default_rng(seed)
+    pings['duration'] = rng.uniform(0.2, 1.0, len(pings))
+    pings['start_time'] = rng.uniform(0, 9.0, len(pings))
+    pings['center_freq'] = 1000.0
+    pings['doppler_shift'] = rng.uniform(-200, 200, len(pings))
+    pings['amplitude_decay'] = rng.uniform(0.1, 0.8, len(pings))
+
+    generators = {
+        'meteor_ping': lambda dtype: meteor_ping.generate_meteor_ping(
+            noise_level=0.0, seed=seed, dtype=dtype)[0],
+        'meteor_ping_spectrograms': lambda dtype: meteor_ping_spectrograms.generate_pings(
+            pings, 44100, 10.0, seed=seed, dtype=dtype),
+        'meteor_ping_simulator': simulator_run,
+        'epsilon_simulator': lambda dtype: EpsilonMeteorSimulator(seed=seed, dtype=dtype).generate_epsilon_echo(
+            duration=12.0, noise_level=0.0)[0],
+    }
+    def traced(generate, dtype):
+        tracemalloc.start()
+        try:
+            x = generate(dtype)
+            return x, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    print(f"float32 against float64 (noiseless, tolerance {tolerance:.0e} of peak)")
+    passed = True
+    for name, generate in generators.items():
+        ref, ref_peak = traced(generate, 'float64')
+        x, peak = traced(generate, 'float32')
+        error = np.max(np.abs(x - ref)) / np.max(np.abs(ref))
+        ok = bool(x.dtype == np.float32 and error <= tolerance)
+        passed = passed and ok
+        print(f"  {name:26s} {x.dtype}, {peak / ref_peak:.2f}x the peak memory, "
+              f"max error {error:.2e} {'ok' if ok else 'FAIL'}")
+    return passed
+
+BENCHMARKS = {
+    'echo_block': bench_echo_block,
+    'spectrogram': bench_spectrogram,
+    'render': bench_render,
+    'nco': bench_nco,
+    'models': check_models,
+    'arrivals': bench_arrivals,
+    'dtype': check_dtype,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='echoSim performance benchmarks')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all)')
+    args = parser.parse_args()
+
+    # Checks return False on failure; benchmarks return results or None
+    failed = [name for name in args.names or BENCHMARKS if BENCHMARKS[name]() is False]
+    if failed:
+        sys.exit(f"failed: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
@@ -86,7 +86,7 @@ class echoSim(gr.top_block, Qt.QWidget):
         self.qtgui_sink_x_0.enable_rf_freq(True)
 
         self.top_layout.addWidget(self._qtgui_sink_x_0_win)
-        self.epy_block_0 = epy_block_0.blk(samp_rate=samp_rate, avg_rate=8.0, tau_min=0.05, tau_max=0.8, doppler_max=400.0, snr_db=40)
+        self.epy_block_0 = epy_block_0.blk(samp_rate=samp_rate, avg_rate=8.0, tau_min=0.05, tau_max=0.8, doppler_max=400.0, snr_db=40, seed=None)
         self.blocks_add_xx_0 = blocks.add_vcc(1)
         self.analog_sig_source_x_0_1 = analog.sig_source_c(samp_rate, analog.GR_COS_WAVE, freq, 1, 0, 0)
         self.analog_noise_source_x_0 = analog.noise_source_c(analog.GR_GAUSSIAN, 1, 0)
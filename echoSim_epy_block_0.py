@@ -1,12 +1,16 @@
 import numpy as np
 from gnuradio import gr
+import pmt
+from echo_models import recursive_envelope, recursive_phase
 
 class blk(gr.sync_block):
     """Meteor echo envelope + Doppler modulator"""
 
+    GAP_BLOCK = 1024  # inter-arrival gaps drawn per refill
+
     def __init__(self, samp_rate=48000, avg_rate=8.0,
                  tau_min=0.05, tau_max=0.8,
-                 doppler_max=400.0, snr_db=15.0):
+                 doppler_max=400.0, snr_db=15.0, seed=None):
         gr.sync_block.__init__(
             self,
             name='Meteor Echo Simulator',
@@ -19,45 +23,105 @@ class blk(gr.sync_block):
         self.tau_max    = tau_max         # longest decay, seconds
         self.doppler_max = doppler_max    # max Doppler shift, Hz
         self.gain_lin   = 10 ** (snr_db / 20.0)
+        self.rng        = np.random.default_rng(seed)
 
         # State
         self._env       = 0.0            # current envelope amplitude
         self._phase     = 0.0            # accumulated Doppler phase
         self._dphi      = 0.0            # phase increment per sample
         self._decay     = 0.0            # per-sample decay factor
+        # Inter-arrival gaps come in bulk from their own stream, so the
+        # meteor parameters drawn from rng do not depend on the block size
+        self._gap_rng   = self.rng.spawn(1)[0]
+        self._gaps      = np.empty(0)    # unit exponential gaps not used yet
+        self._gap_pos   = 0
         self._next_event = self._draw_interval()
+        self._tau       = 0.0            # parameters of the current meteor
+        self._doppler   = 0.0
+
+        # Each meteor onset is also tagged 'meteor' on the output stream
+        self.message_port_register_out(pmt.intern("events"))
 
     def _draw_interval(self):
-        """Exponential inter-arrival time (Poisson process)."""
+        """Exponential inter-arrival time (Poisson process), in samples.
+
+        Unit exponentials are drawn GAP_BLOCK at a time and scaled by the
+        current avg_rate when used, so rate changes apply from the next gap.
+        """
+        if self._gap_pos == len(self._gaps):
+            self._gaps = self._gap_rng.standard_exponential(self.GAP_BLOCK)
+            self._gap_pos = 0
+        gap = self._gaps[self._gap_pos]
+        self._gap_pos += 1
         rate_per_sec = self.avg_rate / 3600.0
-        return int(np.random.exponential(1.0 / rate_per_sec) * self.samp_rate)
+        return int(gap * (1.0 / rate_per_sec) * self.samp_rate)
 
     def _new_meteor(self):
-        tau      = np.random.uniform(self.tau_min, self.tau_max)
-        doppler  = np.random.uniform(-self.doppler_max, self.doppler_max)
+        tau      = self.rng.uniform(self.tau_min, self.tau_max)
+        doppler  = self.rng.uniform(-self.doppler_max, self.doppler_max)
+        self._tau     = tau
+        self._doppler = doppler
         self._decay = np.exp(-1.0 / (tau * self.samp_rate))
         self._dphi  = 2 * np.pi * doppler / self.samp_rate
         self._env   = self.gain_lin      # peak amplitude
-        self._phase = np.random.uniform(0, 2 * np.pi)  # random initial phase
+        self._phase = self.rng.uniform(0, 2 * np.pi)  # random initial phase
+
+    def _announce(self, offset):
+        """Tag the onset sample of the new meteor and publish it on 'events'.
+
+        The tag value is a dict of tau (s), doppler (Hz) and peak (envelope
+        amplitude at onset); the message adds the absolute sample offset.
+        """
+        info = pmt.make_dict()
+        info = pmt.dict_add(info, pmt.intern("tau"), pmt.from_double(self._tau))
+        info = pmt.dict_add(info, pmt.intern("doppler"), pmt.from_double(self._doppler))
+        info = pmt.dict_add(info, pmt.intern("peak"), pmt.from_double(self._env))
+        self.add_item_tag(0, offset, pmt.intern("meteor"), info)
+        self.message_port_pub(
+            pmt.intern("events"),
+            pmt.dict_add(info, pmt.intern("offset"), pmt.from_uint64(offset)))
+
+    def _render(self, inp, out):
+        """Modulate a run of samples that contains no meteor onset.
+
+        The envelope and Doppler phase follow the same recurrences as the
+        per-sample loop (``_env *= _decay``, ``_phase += _dphi``); the
+        echo_models kernels evaluate them with ``accumulate``, which keeps
+        the output bit-identical to it.
+        """
+        m = len(inp)
+        if self._env == 0.0:
+            # No meteor has started yet: nothing to modulate
+            out[:] = 0
+            return
+
+        env = recursive_envelope(self._env, self._decay, m)
+        phase = recursive_phase(self._phase, self._dphi, m)
+
+        out[:] = inp * (env * np.exp(1j * phase))
+
+        self._env   = env[-1] * self._decay
+        self._phase = phase[-1] + self._dphi
 
     def work(self, input_items, output_items):
         inp = input_items[0]
         out = output_items[0]
         n   = len(inp)
+        start = self.nitems_written(0)
 
-        for i in range(n):
-            # Countdown to next meteor
-            self._next_event -= 1
-            if self._next_event <= 0:
+        pos = 0
+        while pos < n:
+            # The countdown is decremented before it is tested, so it
+            # expires on the sample where it starts out at 1 or less
+            if self._next_event <= 1:
                 self._new_meteor()
-                self._next_event = self._draw_interval()
-
-            # Build modulating phasor: envelope × Doppler
-            mod = self._env * np.exp(1j * self._phase)
-            out[i] = inp[i] * mod
+                self._announce(start + pos)
+                self._next_event = self._draw_interval() + 1
 
-            # Decay the envelope, advance the phase
-            self._env   *= self._decay
-            self._phase += self._dphi
+            # Everything up to the next onset shares one meteor state
+            run = min(max(self._next_event - 1, 1), n - pos)
+            self._render(inp[pos:pos + run], out[pos:pos + run])
+            self._next_event -= run
+            pos += run
 
         return n
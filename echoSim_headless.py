@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# SPDX-License-Identifier: GPL-3.0
+#
+# GNU Radio Python Flow Graph
+# Title: echoSim (headless)
+# GNU Radio version: 3.10.9.2
+
+from gnuradio import analog
+from gnuradio import blocks
+from gnuradio import gr
+import sys
+import signal
+import time
+from argparse import ArgumentParser, ArgumentTypeError
+from gnuradio.eng_arg import eng_float, intx
+from gnuradio import eng_notation
+import echoSim_epy_block_0 as epy_block_0  # embedded python block of echoSim.grc
+
+
+
+
+class echoSim_headless(gr.top_block):
+    """
+    The echoSim chain (carrier -> Meteor Echo Simulator, plus noise) without
+    the Qt sink or a throttle, so it runs as fast as the CPU allows. Output
+    goes to a file_sink (complex64), or a null_sink when output is empty;
+    n_samples > 0 stops the flowgraph after that many samples via head.
+    seed must be positive or None: noise_source_c seeds itself from the
+    clock when given 0.
+    """
+
+    def __init__(self, n_samples=48000 * 600, output='echoSim.cf32', samp_rate=48000,
+                 seed=None):
+        gr.top_block.__init__(self, "echoSim (headless)", catch_exceptions=True)
+        if seed is not None and seed <= 0:
+            raise ValueError(f"seed must be positive (noise_source_c seeds 0 from the clock), got {seed}")
+
+        ##################################################
+        # Parameters
+        ##################################################
+        self.n_samples = n_samples
+        self.output = output
+        self.samp_rate = samp_rate
+        self.seed = seed
+
+        ##################################################
+        # Variables
+        ##################################################
+        self.freq = freq = 49970000
+
+        ##################################################
+        # Blocks
+        ##################################################
+
+        if output:
+            self.blocks_sink_0 = blocks.file_sink(gr.sizeof_gr_complex*1, output, False)
+            self.blocks_sink_0.set_unbuffered(False)
+        else:
+            self.blocks_sink_0 = blocks.null_sink(gr.sizeof_gr_complex*1)
+        self.epy_block_0 = epy_block_0.blk(samp_rate=samp_rate, avg_rate=8.0, tau_min=0.05, tau_max=0.8, doppler_max=400.0, snr_db=40, seed=seed)
+        self.blocks_add_xx_0 = blocks.add_vcc(1)
+        self.analog_sig_source_x_0_1 = analog.sig_source_c(samp_rate, analog.GR_COS_WAVE, freq, 1, 0, 0)
+        self.analog_noise_source_x_0 = analog.noise_source_c(analog.GR_GAUSSIAN, 1, 0 if seed is None else seed)
+
+
+        ##################################################
+        # Connections
+        ##################################################
+        self.connect((self.analog_noise_source_x_0, 0), (self.blocks_add_xx_0, 1))
+        self.connect((self.analog_sig_source_x_0_1, 0), (self.epy_block_0, 0))
+        self.connect((self.epy_block_0, 0), (self.blocks_add_xx_0, 0))
+        if n_samples > 0:
+            self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex*1, n_samples)
+            self.connect((self.blocks_add_xx_0, 0), (self.blocks_head_0, 0))
+            self.connect((self.blocks_head_0, 0), (self.blocks_sink_0, 0))
+        else:
+            self.connect((self.blocks_add_xx_0, 0), (self.blocks_sink_0, 0))
+
+    def samples_processed(self):
+        """Samples that reached the sink (the echo block runs ahead of head)"""
+        if self.n_samples > 0:
+            return self.blocks_head_0.nitems_written(0)
+        return self.blocks_sink_0.nitems_read(0)
+
+    def get_freq(self):
+        return self.freq
+
+    def set_freq(self, freq):
+        self.freq = freq
+        self.analog_sig_source_x_0_1.set_frequency(self.freq)
+
+
+
+def positive_seed(value):
+    seed = int(value)
+    if seed <= 0:
+        raise ArgumentTypeError(f"{value!r} is not a positive seed")
+    return seed
+
+
+def argument_parser():
+    parser = ArgumentParser(description='echoSim without GUI or throttle, for batch runs and benchmarking')
+    parser.add_argument(
+        "-N", "--n-samples", dest="n_samples", type=intx, default=48000 * 600,
+        help="Stop after this many samples, 0 to run until interrupted [default=%(default)r]")
+    parser.add_argument(
+        "-o", "--output", dest="output", type=str, default='echoSim.cf32',
+        help="complex64 output file, empty for a null sink [default=%(default)r]")
+    parser.add_argument(
+        "-s", "--samp-rate", dest="samp_rate", type=eng_float, default=eng_notation.num_to_str(float(48000)),
+        help="Set sample rate [default=%(default)r]")
+    parser.add_argument(
+        "--seed", dest="seed", type=positive_seed, default=None,
+        help="Positive RNG seed for the meteor and noise sources; 0 is refused, since the "
+             "noise source would seed itself from the clock [default=%(default)r: unseeded]")
+    return parser
+
+
+def main(top_block_cls=echoSim_headless, options=None):
+    if options is None:
+        options = argument_parser().parse_args()
+    tb = top_block_cls(n_samples=options.n_samples, output=options.output,
+                       samp_rate=int(options.samp_rate), seed=options.seed)
+
+    def report(elapsed):
+        n = tb.samples_processed()
+        print(f"{n} samples in {elapsed:.2f} s: {n / max(elapsed, 1e-9):.0f} samples/s "
+              f"({n / max(elapsed, 1e-9) / tb.samp_rate:.1f}x real time)")
+
+    start = time.perf_counter()
+
+    def sig_handler(sig=None, frame=None):
+        tb.stop()
+        tb.wait()
+        report(time.perf_counter() - start)
+
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, sig_handler)
+    signal.signal(signal.SIGTERM, sig_handler)
+
+    tb.start()
+
+    tb.wait()
+    report(time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
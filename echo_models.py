@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Meteor echo model kernels shared by the offline simulators and the GNU Radio
+blocks. Each kernel is vectorized and takes either sample times or a run
+length plus carried state, so a signal can be built chunk by chunk.
+"""
+import numpy as np
+from functools import lru_cache
+from nco import NCO
+
+# Arrival processes (meteor_ping_simulator)
+
+def _gap_block(mean_count):
+    """Gaps to draw for mean_count expected arrivals: enough for ~4 sigma"""
+    return int(mean_count + 4 * np.sqrt(mean_count)) + 1
+
+ARRIVAL_BLOCK = 4096  # most expected arrivals drawn per block
+
+def poisson_arrival_blocks(rate, T, rng):
+    """
+    Sorted onset times in [0, T) of a Poisson process of rate events per
+    second, yielded a block at a time
+
+    Exponential gaps for up to about ARRIVAL_BLOCK arrivals are drawn at a
+    time and cumsum'd on from the last onset until T is covered, so a long
+    run never holds more than one block. The sums run in draw order, so
+    the times equal those of adding one rng.exponential(1/rate) draw at a
+    time.
+    """
+    scale = 1.0 / max(rate, 1e-9)
+    last = 0.0
+    while True:
+        gaps = rng.exponential(scale, _gap_block(min((T - last) / scale, ARRIVAL_BLOCK)))
+        gaps[0] += last
+        times = np.cumsum(gaps, out=gaps)
+        if times[-1] >= T:
+            yield times[:np.searchsorted(times, T)]
+            return
+        yield times
+        last = times[-1]
+
+def poisson_arrivals(rate, T, rng):
+    """All of poisson_arrival_blocks in one array"""
+    return np.concatenate(list(poisson_arrival_blocks(rate, T, rng)))
+
+def thinned_arrival_blocks(rate_fn, rate_max, T, rng):
+    """
+    Onset times in [0, T) of a non-homogeneous Poisson process, by
+    thinning, yielded a block at a time
+
+    Candidates are drawn at rate_max and each is kept with probability
+    rate_fn(t) / rate_max. rate_fn takes an array of times in seconds and
+    returns events per second, no more than rate_max anywhere in [0, T).
+    """
+    for times in poisson_arrival_blocks(rate_max, T, rng):
+        keep = rng.random(len(times)) * rate_max < rate_fn(times)
+        yield times[keep]
+
+def thinned_arrivals(rate_fn, rate_max, T, rng):
+    """All of thinned_arrival_blocks in one array"""
+    return np.concatenate(list(thinned_arrival_blocks(rate_fn, rate_max, T, rng)))
+
+def shower_rate(background, peak, t_peak, width):
+    """
+    Rate profile of a meteor shower for thinned_arrivals: a Gaussian of
+    standard deviation width seconds, peak events/s above background at
+    t_peak. Returns (rate_fn, rate_max).
+    """
+    def rate_fn(t):
+        return background + peak * np.exp(-0.5 * ((t - t_peak) / width)**2)
+    return rate_fn, background + peak
+
+def diurnal_rate(mean, depth=0.5, t_max=6 * 3600.0, period=86400.0):
+    """
+    Sinusoidal daily rate profile for thinned_arrivals, mean events/s
+    modulated by +/- depth (0..1) with the maximum at t_max seconds.
+    Returns (rate_fn, rate_max).
+    """
+    def rate_fn(t):
+        return mean * (1.0 + depth * np.cos(2 * np.pi * (t - t_max) / period))
+    return rate_fn, mean * (1.0 + depth)
+
+# Underdense / overdense trails (meteor_ping_simulator)
+
+def underdense_envelope(t, tau):
+    env = np.exp(-np.clip(t, 0, None) / max(tau, 1e-6))
+    env[t < 0] = 0.0
+    return env
+
+def underdense_span(tau, floor_db):
+    """Time after onset at which exp(-t/tau) falls below floor_db."""
+    return np.maximum(tau, 1e-6) * max(-floor_db, 0.0) / 20.0 * np.log(10.0)
+
+@lru_cache(maxsize=64)
+def _cosine_taper(ramp):
+    """0.5 - 0.5*cos(pi*k/ramp) for k = 1..ramp, read-only"""
+    taper = 0.5 - 0.5 * np.cos(np.pi * np.arange(1, ramp + 1) / ramp)
+    taper.flags.writeable = False
+    return taper
+
+@lru_cache(maxsize=32)
+def _raised_cosine_window(N, frac):
+    ramp = max(int(frac * N), 1)
+    taper = _cosine_taper(ramp)
+    w = np.ones(N, dtype=float)
+    w[:ramp] = taper
+    w[N - ramp:] = taper[::-1]
+    w.flags.writeable = False
+    return w
+
+def raised_cosine_window(N, frac=0.05):
+    """
+    N ones with raised-cosine ramps over frac of N (at most 0.5) at each
+    end, read-only. Cached by (N, frac), since a streamed overdense event
+    asks for the same window once per chunk.
+    """
+    return _raised_cosine_window(max(N, 1), frac)
+
+def doppler_phase(t, fd0, fd1, fd2):
+    return 2 * np.pi * (fd0 * t + 0.5 * fd1 * t**2 + (1.0/6.0) * fd2 * t**3)
+
+# Burst envelope template (gr_meteor burst source)
+
+@lru_cache(maxsize=8)
+def underdense_template(samp_rate, ud_dur, riseFracc):
+    """
+    An exponential rise over riseFracc of ud_dur and an exponential decay
+    over the rest, as read-only complex64; the burst source supplies the
+    spacing. Cached, since every gr_meteor setter asks for it again.
+    """
+    ud_samples = samp_rate * ud_dur
+    n_rise = int(riseFracc * ud_samples)
+    n_decay = int((1 - riseFracc) * ud_samples)
+    env = np.empty(n_rise + n_decay, dtype=np.complex64)
+    env[:n_rise] = np.exp(np.arange(-n_rise, 0) / (riseFracc * ud_samples))
+    env[n_rise:] = np.exp(-np.arange(n_decay) / ((1 - riseFracc) * ud_samples))
+    env.flags.writeable = False
+    return env
+
+# Burst trains (meteor burst source blocks)
+
+class BurstTrain:
+    """
+    Meteor burst envelopes at Poisson (or evenly spaced) onsets, produced
+    chunk by chunk
+
+    interval is the mean time between onsets in seconds (the fixed spacing
+    when poisson is False). Only the bursts are stored and written; the
+    gaps are bulk zero fills, so memory does not depend on the interval.
+    Overlapping bursts add. A burst keeps the envelope it started with, so
+    samp_rate, interval and envelope can be changed between chunks.
+    """
+    def __init__(self, samp_rate, interval, envelope, poisson=True, rng=None):
+        self.samp_rate = samp_rate
+        self.interval = interval
+        self.envelope = envelope
+        self.poisson = poisson
+        self.rng = np.random.default_rng(rng)
+        self._active = []   # (envelope, next index) of bursts still running
+        self._next_onset = self._draw_gap()  # samples from the start of the next chunk
+
+    @property
+    def envelope(self):
+        return self._envelope
+
+    @envelope.setter
+    def envelope(self, envelope):
+        self._envelope = np.asarray(envelope, dtype=np.complex64)
+
+    def _draw_gap(self):
+        gap = self.rng.exponential(self.interval) if self.poisson else self.interval
+        return max(int(round(gap * self.samp_rate)), 1)
+
+    def fill(self, out):
+        """Write the next len(out) samples of the train into out"""
+        n = len(out)
+        out[:] = 0
+        active = []
+        for env, pos in self._active:
+            m = min(len(env) - pos, n)
+            out[:m] += env[pos:pos + m]
+            if pos + m < len(env):
+                active.append((env, pos + m))
+        while self._next_onset < n:
+            start = self._next_onset
+            env = self._envelope
+            m = min(len(env), n - start)
+            out[start:start + m] += env[:m]
+            if m < len(env):
+                active.append((env, m))
+            self._next_onset += self._draw_gap()
+        self._next_onset -= n
+        self._active = active
+        return n
+
+# Per-sample recurrences (echoSim_epy_block_0)
+
+def recursive_envelope(env0, decay, n):
+    """env0 * decay**k for k < n, by the same recurrence as env *= decay"""
+    env = np.full(n, decay)
+    env[0] = env0
+    return np.multiply.accumulate(env, out=env)
+
+def recursive_phase(phase0, dphi, n):
+    """phase0 + k*dphi for k < n, by the same recurrence as phase += dphi"""
+    phase = np.full(n, dphi)
+    phase[0] = phase0
+    return np.add.accumulate(phase, out=phase)
+
+# Epsilon echoes (epsilon_simulator)
+
+def epsilon_profiles(t, duration, max_doppler):
+    """
+    Amplitude envelope and Doppler profile at times t; duration and
+    max_doppler may be arrays that broadcast against t
+    """
+    # Epsilon echo characteristics
+    build_up = 0.5  # seconds to reach peak
+    sustain = 2.0   # seconds of sustained echo
+    decay = np.broadcast_to(duration - build_up - sustain, t.shape)
+
+    amplitude = np.zeros_like(t)
+    rising = t < build_up
+    amplitude[rising] = t[rising] / build_up
+    amplitude[(t >= build_up) & (t < build_up + sustain)] = 1.0
+    decaying = t >= build_up + sustain
+    decay_time = t[decaying] - (build_up + sustain)
+    amplitude[decaying] = np.exp(-decay_time / (decay[decaying] * 0.5))
+
+    # Complex Doppler evolution
+    doppler = max_doppler * (0.5 + 0.5 * np.sin(2 * np.pi * 0.1 * t)) * np.exp(-t / (duration * 0.7))
+
+    return amplitude, doppler
+
+# Meteor pings (meteor_ping, meteor_ping_spectrogram, meteor_ping_spectrograms)
+
+def ping_profiles(t, duration, doppler_shift, amplitude_decay):
+    """Exponential amplitude decay and decaying Doppler shift of a ping"""
+    # Exponential amplitude decay (simulating trail dissipation)
+    amplitude = np.exp(-t / amplitude_decay)
+
+    # Time-varying Doppler shift (simulating trail evolution)
+    doppler = doppler_shift * np.exp(-t / (duration * 0.5))
+
+    return amplitude, doppler
+
+def ping_carrier(t, center_freq, doppler, sample_rate, oscillator='exact'):
+    """sin(2*pi*(center_freq + doppler)*t), from np.sin or the float32 NCO"""
+    if oscillator == 'nco':
+        # The same phase, integrated sample by sample by the NCO
+        cycles = (center_freq + doppler) * t
+        return NCO(sample_rate).sin(freq=np.diff(cycles, prepend=0.0) * sample_rate)
+    return np.sin(2 * np.pi * (center_freq + doppler) * t)
+
+# Output scaling (all offline generators)
+
+def headroom_peak(signal_peak, noise_std, n_sigma=6.0):
+    """
+    Fixed full-scale level for output scaled before its actual peak is known:
+    the largest signal amplitude plus n_sigma standard deviations of noise
+    """
+    return signal_peak + n_sigma * noise_std
@@ -4,52 +4,214 @@ import matplotlib.pyplot as plt
 from scipy import signal
 import wave
 import struct
+import argparse
+import rendering
+from nco import NCO
+from echo_models import epsilon_profiles, headroom_peak
+
+# Per-echo parameters of a batch; n_samples is filled in by generate_echo_batch
+ECHO_PARAMS_DTYPE = np.dtype([
+    ('duration', 'f8'),
+    ('center_freq', 'f8'),
+    ('max_doppler', 'f8'),
+    ('noise_level', 'f8'),
+    ('turbulence_level', 'f8'),
+    ('echo_strength', 'f8'),
+    ('n_samples', 'i8'),
+])
+
+class EchoRecord:
+    """
+    Scalar parameters of one generated echo
+
+    The amplitude envelope and Doppler profile are rebuilt from the
+    parameters when asked for; with memoize=True the first rebuild is kept.
+    Item access (record['duration']) works like the old metadata dicts.
+    """
+    __slots__ = ECHO_PARAMS_DTYPE.names + ('sample_rate', 'memoize', '_profiles')
+    
+    def __init__(self, sample_rate, duration, center_freq, max_doppler, noise_level,
+                 turbulence_level, echo_strength, n_samples=None, memoize=False):
+        self.sample_rate = sample_rate
+        self.duration = duration
+        self.center_freq = center_freq
+        self.max_doppler = max_doppler
+        self.noise_level = noise_level
+        self.turbulence_level = turbulence_level
+        self.echo_strength = echo_strength
+        self.n_samples = int(sample_rate * duration) if n_samples is None else n_samples
+        self.memoize = memoize
+        self._profiles = None
+    
+    @classmethod
+    def from_params(cls, row, sample_rate, memoize=False):
+        """Record for one row of an ECHO_PARAMS_DTYPE array"""
+        return cls(sample_rate, memoize=memoize, **{name: row[name].item() for name in row.dtype.names})
+    
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    def __repr__(self):
+        return (f"EchoRecord(duration={self.duration:.3f}, center_freq={self.center_freq:.1f}, "
+                f"max_doppler={self.max_doppler:.1f}, echo_strength={self.echo_strength:.3f})")
+    
+    def profiles(self):
+        """(amplitude_envelope, doppler_profile) as generate_epsilon_echo computes them"""
+        if self._profiles is not None:
+            return self._profiles
+        t = np.linspace(0, self.duration, self.n_samples)
+        profiles = epsilon_profiles(t, self.duration, self.max_doppler)
+        if self.memoize:
+            self._profiles = profiles
+        return profiles
+    
+    @property
+    def amplitude_envelope(self):
+        return self.profiles()[0]
+    
+    @property
+    def doppler_profile(self):
+        return self.profiles()[1]
+    
+    def clear(self):
+        """Drop memoized profiles"""
+        self._profiles = None
 
 class EpsilonMeteorSimulator:
-    def __init__(self, sample_rate=44100):
+    def __init__(self, sample_rate=44100, seed=None, dtype=np.float64):
         self.sample_rate = sample_rate
+        self.rng = np.random.default_rng(seed)
+        self.dtype = np.dtype(dtype)  # float32: samples and noise in single precision
+        
+    def _echo_chunks(self, duration, center_freq, max_doppler, noise_level,
+                     turbulence_level, echo_strength, rng, chunk_size,
+                     oscillator='exact'):
+        """
+        Yield (t, signal, amplitude, doppler) of an unnormalized epsilon echo
+        chunk by chunk. The Doppler and turbulence phase integrals carry over
+        between chunks and the two noise sources draw from separate streams,
+        so the samples do not depend on chunk_size. oscillator='nco' builds
+        the carrier with a float32 NCO instead of np.sin of the phase. Only
+        t and the phase are float64; signal and amplitude are self.dtype.
+        """
+        n = int(self.sample_rate * duration)
+        step = duration / (n - 1) if n > 1 else 0.0
+        turb_rng, noise_rng = rng.spawn(2)
+        doppler_acc = 0.0
+        turb_acc = 0.0
+        nco = NCO(self.sample_rate) if oscillator == 'nco' else None
+        t_prev = 0.0
         
+        for c0 in range(0, n, chunk_size):
+            c1 = min(c0 + chunk_size, n)
+            
+            # Samples c0..c1 of np.linspace(0, duration, n)
+            t = np.arange(c0, c1) * step
+            if c1 == n and n > 1:
+                t[-1] = duration
+            
+            amplitude, doppler = epsilon_profiles(t, duration, max_doppler)
+            amplitude = amplitude.astype(self.dtype, copy=False)
+            turb = turb_rng.standard_normal(c1 - c0)
+            
+            if nco is not None:
+                # The same phase, integrated sample by sample by the NCO
+                freq = center_freq * self.sample_rate * np.diff(t, prepend=t_prev)
+                freq += doppler + turbulence_level * turb
+                carrier = nco.sin(freq=freq)
+                t_prev = t[-1]
+            else:
+                doppler_sum = doppler.copy()
+                doppler_sum[0] += doppler_acc
+                np.cumsum(doppler_sum, out=doppler_sum)
+                doppler_acc = doppler_sum[-1]
+                
+                # Phase fluctuations
+                turb[0] += turb_acc
+                np.cumsum(turb, out=turb)
+                turb_acc = turb[-1]
+                phase_noise = turbulence_level * turb / self.sample_rate
+                
+                # Generate the signal
+                carrier = np.sin(2 * np.pi * center_freq * t + 
+                                2 * np.pi * doppler_sum / self.sample_rate +
+                                2 * np.pi * phase_noise)
+            
+            signal = self.dtype.type(echo_strength) * amplitude * carrier.astype(self.dtype, copy=False)
+            
+            # Add noise
+            signal += self.dtype.type(noise_level) * noise_rng.standard_normal(c1 - c0, dtype=self.dtype)
+            
+            yield t, signal, amplitude, doppler
+    
     def generate_epsilon_echo(self, duration=10.0, center_freq=1000, 
                             max_doppler=50, noise_level=0.05, 
-                            turbulence_level=0.1, echo_strength=0.8):
+                            turbulence_level=0.1, echo_strength=0.8, seed=None,
+                            normalize='peak', oscillator='exact', chunk_size=65536):
         """
         Generate epsilon meteor echo simulation
+
+        seed overrides the simulator's generator for this echo; it may be an
+        int or a np.random.Generator. normalize is 'peak' (scale the actual
+        peak to 0.9) or 'headroom' (the fixed level used for streaming).
+        oscillator='nco' uses the float32 NCO for the carrier. signal and
+        amplitude are self.dtype; t and doppler stay float64, since a float32
+        time axis gets coarser than a sample on long echoes. All four are
+        filled chunk_size samples at a time, so float64 temporaries never
+        span the whole echo.
         """
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
-        
-        # Epsilon echo characteristics
-        build_up = 0.5  # seconds to reach peak
-        sustain = 2.0   # seconds of sustained echo
-        decay = duration - build_up - sustain
-        
-        amplitude = np.zeros_like(t)
-        amplitude[t < build_up] = t[t < build_up] / build_up
-        amplitude[(t >= build_up) & (t < build_up + sustain)] = 1.0
-        decay_time = t[t >= build_up + sustain] - (build_up + sustain)
-        amplitude[t >= build_up + sustain] = np.exp(-decay_time / (decay * 0.5))
-        
-        # Complex Doppler evolution
-        doppler = max_doppler * (0.5 + 0.5 * np.sin(2 * np.pi * 0.1 * t)) * np.exp(-t / (duration * 0.7))
-        
-        # Phase fluctuations
-        phase_noise = turbulence_level * np.cumsum(np.random.randn(len(t))) / self.sample_rate
-        
-        # Generate the signal
-        carrier = np.sin(2 * np.pi * center_freq * t + 
-                        2 * np.pi * np.cumsum(doppler) / self.sample_rate +
-                        2 * np.pi * phase_noise)
-        
-        signal = echo_strength * amplitude * carrier
-        
-        # Add noise
-        noise = noise_level * np.random.randn(len(t))
-        signal += noise
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        n = int(self.sample_rate * duration)
+        signal, amplitude = (np.empty(n, dtype=self.dtype) for _ in range(2))
+        t, doppler = (np.empty(n) for _ in range(2))
+        pos = 0
+        for chunk in self._echo_chunks(duration, center_freq, max_doppler, noise_level,
+                                       turbulence_level, echo_strength, rng,
+                                       chunk_size, oscillator):
+            m = len(chunk[0])
+            for out, values in zip((t, signal, amplitude, doppler), chunk):
+                out[pos:pos + m] = values
+            pos += m
         
         # Normalize
-        signal = 0.9 * signal / np.max(np.abs(signal))
+        if normalize == 'headroom':
+            signal *= 0.9 / headroom_peak(echo_strength, noise_level)
+        elif normalize == 'peak':
+            peak = max(np.max(signal), -np.min(signal))
+            np.multiply(signal, 0.9, out=signal)
+            signal /= peak
+        else:
+            raise ValueError(f"unknown normalize mode: {normalize}")
         
         return signal, t, amplitude, doppler
     
+    def stream_epsilon_echo(self, duration=10.0, center_freq=1000, 
+                            max_doppler=50, noise_level=0.05, 
+                            turbulence_level=0.1, echo_strength=0.8, seed=None,
+                            chunk_size=65536, normalize='headroom', oscillator='exact'):
+        """
+        Yield an epsilon echo in chunks of chunk_size samples
+
+        Same samples as generate_epsilon_echo(normalize='headroom') for the
+        same seed, so memory use does not grow with duration. The peak is not
+        known until the end, so 'peak' is not available; pass normalize=None
+        for the raw samples, e.g. to write them out and rescale in a second
+        pass.
+        """
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        if normalize == 'headroom':
+            scale = 0.9 / headroom_peak(echo_strength, noise_level)
+        elif normalize is None:
+            scale = 1.0
+        else:
+            raise ValueError(f"cannot normalize a stream by {normalize!r}: "
+                             "use 'headroom' or None")
+        for _, signal, _, _ in self._echo_chunks(
+                duration, center_freq, max_doppler, noise_level,
+                turbulence_level, echo_strength, rng, chunk_size, oscillator):
+            signal *= scale
+            yield signal
+    
     def save_wav(self, signal, filename, sample_rate=44100):
         """Save signal as WAV file using standard wave module"""
         # Convert to 16-bit PCM
@@ -63,6 +225,18 @@ class EpsilonMeteorSimulator:
         
         print(f"Saved {filename}")
     
+    def save_wav_chunks(self, chunks, filename, sample_rate=44100):
+        """Stream signal chunks into a 16-bit WAV file, clipping to [-1, 1]"""
+        with wave.open(filename, 'w') as wav_file:
+            wav_file.setnchannels(1)  # Mono
+            wav_file.setsampwidth(2)  # 2 bytes = 16 bits
+            wav_file.setframerate(sample_rate)
+            for chunk in chunks:
+                chunk_int = np.int16(np.clip(chunk, -1.0, 1.0) * 32767)
+                wav_file.writeframes(chunk_int.tobytes())
+        
+        print(f"Saved {filename}")
+    
     def plot_echo_characteristics(self, t, signal, amplitude, doppler):
         """Plot the epsilon echo characteristics"""
         fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 8))
@@ -85,42 +259,122 @@ class EpsilonMeteorSimulator:
         
         plt.tight_layout()
         plt.savefig('epsilon_echo_characteristics.png', dpi=150, bbox_inches='tight')
-        plt.show()
+        rendering.show(fig)
     
-    def generate_multiple_echoes(self, num_echoes=5, min_duration=3.0, 
-                               max_duration=15.0, **kwargs):
-        """Generate multiple epsilon echoes"""
-        all_signals = []
-        metadata = []
+    def generate_echo_batch(self, params, seed=None, chunk_size=65536):
+        """
+        Generate a batch of epsilon echoes as one padded (K, max_len) array
+
+        params is a structured array of ECHO_PARAMS_DTYPE, one row per echo.
+        Returns (signals, mask, params): mask marks the valid samples of each
+        row, the rest is zero, and params is a copy with n_samples filled in.
+        Row k matches generate_epsilon_echo with the same parameters, drawing
+        from the same generator in order. All rows are computed together, in
+        column blocks of about chunk_size samples, into a self.dtype array.
+        """
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        params = np.array(params, dtype=ECHO_PARAMS_DTYPE)
+        n = (self.sample_rate * params['duration']).astype(np.int64)
+        params['n_samples'] = n
+        n_max = int(n.max()) if len(params) else 0
         
-        for i in range(num_echoes):
-            duration = np.random.uniform(min_duration, max_duration)
-            center_freq = kwargs.get('center_freq', 800 + np.random.uniform(-100, 100))
-            max_doppler = kwargs.get('max_doppler', 20 + np.random.uniform(0, 30))
+        def column(name, dtype=np.float64):
+            return params[name][:, None].astype(dtype)
+        
+        # Phase fluctuations and additive noise, from the same streams as
+        # generate_epsilon_echo would spawn for each echo
+        streams = [rng.spawn(2) for _ in range(len(params))]
+        step = params['duration'] / np.maximum(n - 1, 1)
+        signals = np.zeros((len(params), n_max), dtype=self.dtype)
+        peak = np.zeros((len(params), 1), dtype=self.dtype)
+        doppler_acc = np.zeros((len(params), 1))
+        turb_acc = np.zeros((len(params), 1))
+        
+        width = max(chunk_size // max(len(params), 1), 1)
+        for c0 in range(0, n_max, width):
+            c1 = min(c0 + width, n_max)
             
-            sig, t, amp, dopp = self.generate_epsilon_echo(
-                duration=duration,
-                center_freq=center_freq,
-                max_doppler=max_doppler,
-                noise_level=kwargs.get('noise_level', 0.05),
-                turbulence_level=kwargs.get('turbulence_level', 0.1),
-                echo_strength=kwargs.get('echo_strength', 0.7 + np.random.uniform(-0.2, 0.2))
-            )
+            # Columns c0..c1 of np.linspace(0, duration_k, n_k), zero-padded
+            k = np.arange(c0, c1)
+            mask = k < n[:, None]
+            t = np.where(mask, k * step[:, None], 0.0)
+            ends = np.flatnonzero((n > 1) & (n - 1 >= c0) & (n - 1 < c1))
+            t[ends, n[ends] - 1 - c0] = params['duration'][ends]
             
-            all_signals.append(sig)
-            metadata.append({
-                'duration': duration,
-                'center_freq': center_freq,
-                'max_doppler': max_doppler,
-                'amplitude_envelope': amp,
-                'doppler_profile': dopp
-            })
+            amplitude, doppler = epsilon_profiles(t, column('duration'), column('max_doppler'))
+            
+            turb = np.zeros_like(t)
+            noise = np.zeros(t.shape, dtype=self.dtype)
+            for row, (turb_rng, noise_rng) in enumerate(streams):
+                m = min(max(n[row] - c0, 0), c1 - c0)
+                turb[row, :m] = turb_rng.standard_normal(m)
+                noise[row, :m] = noise_rng.standard_normal(m, dtype=self.dtype)
+            
+            # Phase integrals, carried over from the previous columns
+            doppler[:, :1] += doppler_acc
+            np.cumsum(doppler, axis=1, out=doppler)
+            doppler_acc = doppler[:, -1:]
+            turb[:, :1] += turb_acc
+            np.cumsum(turb, axis=1, out=turb)
+            turb_acc = turb[:, -1:]
+            phase_noise = column('turbulence_level') * turb / self.sample_rate
+            
+            # Generate the signals
+            carrier = np.sin(2 * np.pi * column('center_freq') * t + 
+                            2 * np.pi * doppler / self.sample_rate +
+                            2 * np.pi * phase_noise)
+            
+            chunk = (column('echo_strength', self.dtype) * amplitude.astype(self.dtype, copy=False) *
+                     carrier.astype(self.dtype, copy=False))
+            chunk += column('noise_level', self.dtype) * noise
+            chunk[~mask] = 0.0
+            signals[:, c0:c1] = chunk
+            np.maximum(peak, np.max(np.abs(chunk), axis=1, keepdims=True), out=peak)
+        
+        # Normalize each row
+        np.multiply(signals, 0.9, out=signals)
+        signals /= np.where(peak > 0, peak, 1.0)
+        
+        mask = np.arange(n_max) < n[:, None]
+        return signals, mask, params
+    
+    def generate_multiple_echoes(self, num_echoes=5, min_duration=3.0, 
+                               max_duration=15.0, memoize=False, **kwargs):
+        """
+        Generate multiple epsilon echoes
+
+        Returns (signals, metadata): signals are views into one padded batch
+        (see generate_echo_batch) and metadata holds one EchoRecord per echo,
+        which rebuilds its amplitude envelope and Doppler profile on demand
+        (kept after the first rebuild when memoize is True).
+        """
+        params = np.zeros(num_echoes, dtype=ECHO_PARAMS_DTYPE)
+        
+        for i in range(num_echoes):
+            params[i]['duration'] = self.rng.uniform(min_duration, max_duration)
+            params[i]['center_freq'] = kwargs.get('center_freq', 800 + self.rng.uniform(-100, 100))
+            params[i]['max_doppler'] = kwargs.get('max_doppler', 20 + self.rng.uniform(0, 30))
+            params[i]['noise_level'] = kwargs.get('noise_level', 0.05)
+            params[i]['turbulence_level'] = kwargs.get('turbulence_level', 0.1)
+            params[i]['echo_strength'] = kwargs.get('echo_strength', 0.7 + self.rng.uniform(-0.2, 0.2))
+        
+        signals, _, params = self.generate_echo_batch(params, seed=self.rng)
+        all_signals = [signals[i, :length] for i, length in enumerate(params['n_samples'])]
+        metadata = [EchoRecord.from_params(row, self.sample_rate, memoize) for row in params]
         
         return all_signals, metadata
 
 def main():
+    parser = argparse.ArgumentParser(description='Epsilon Meteor Echo Simulator')
+    parser.add_argument('--seed', type=int, default=None, help='RNG seed for reproducible runs')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='Sample type of the generated echoes')
+    args = parser.parse_args()
+    
+    rendering.select_backend()
+
     # Initialize simulator
-    simulator = EpsilonMeteorSimulator(sample_rate=44100)
+    simulator = EpsilonMeteorSimulator(sample_rate=44100, seed=args.seed, dtype=args.dtype)
     
     # Generate single epsilon echo
     print("Generating epsilon meteor echo...")
@@ -1,78 +1,236 @@
 #!/usr/bin/env python3
 import numpy as np
 import matplotlib.pyplot as plt
-import wave
+import struct
 import glob
 import os
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import rendering
+
+# WAVE_FORMAT_* tags of the fmt chunk
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class PCMWavData:
+    """First channel of a PCM or 32-bit float WAV file, decoded to float32 on slicing
+
+    The sample data stays memory-mapped from the file; only the slices that
+    are asked for are decoded, so long recordings never sit in memory.
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:] != b'WAVE':
+                raise ValueError(f"{filename} is not a RIFF/WAVE file")
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"{filename} has no data chunk")
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    f.seek(chunk_size & 1, 1)
+                elif chunk_id == b'data':
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(chunk_size + (chunk_size & 1), 1)
+            f.seek(0, 2)
+            file_size = f.tell()
+        if fmt is None or len(fmt) < 16:
+            raise ValueError(f"{filename} has no fmt chunk before its data")
+        
+        format_tag, self.n_channels, self.frame_rate, _, block_align, bits = \
+            struct.unpack_from('<HHIIHH', fmt)
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 40:
+            # The real format is the first two bytes of the SubFormat GUID
+            format_tag, = struct.unpack_from('<H', fmt, 24)
+        self.samp_width = (bits + 7) // 8
+        self.is_float = format_tag == WAVE_FORMAT_IEEE_FLOAT
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"{filename}: unknown format: {format_tag}")
+        if self.is_float and bits != 32:
+            raise ValueError(f"{filename}: unsupported float sample size: {bits} bits")
+        if self.samp_width not in (1, 2, 3, 4) or block_align != self.n_channels * self.samp_width:
+            raise ValueError(f"{filename}: unsupported sample layout: {bits} bits "
+                             f"in {block_align}-byte frames of {self.n_channels} channels")
+        # Streaming writers may leave the data size unset
+        data_size = min(chunk_size, file_size - offset)
+        n_frames = data_size // block_align
+        
+        if self.samp_width == 1:  # 8-bit, unsigned
+            raw = np.memmap(filename, np.uint8, 'r', offset, (n_frames, block_align))
+        elif self.samp_width == 2:  # 16-bit
+            raw = np.memmap(filename, '<i2', 'r', offset, (n_frames, block_align // 2))
+        elif self.samp_width == 3:  # 24-bit, packed
+            raw = np.memmap(filename, np.uint8, 'r', offset, (n_frames, block_align // 3, 3))
+        else:  # 32-bit integer or float
+            raw = np.memmap(filename, '<f4' if self.is_float else '<i4', 'r', offset,
+                            (n_frames, block_align // 4))
+        # Zero-copy view of the first channel
+        self.raw = raw[:, 0]
+    
+    def __len__(self):
+        return len(self.raw)
+    
+    def __getitem__(self, index):
+        raw = self.raw[index]
+        if self.samp_width == 1:
+            return (raw.astype(np.float32) - 128.0) / 128.0
+        elif self.samp_width == 2:
+            return raw.astype(np.float32) / 32768.0
+        elif self.samp_width == 3:
+            # Little-endian bytes; the top byte carries the sign
+            data = (raw[..., 0].astype(np.int32) |
+                    (raw[..., 1].astype(np.int32) << 8) |
+                    (raw[..., 2].view(np.int8).astype(np.int32) << 16))
+            return data.astype(np.float32) / 8388608.0
+        elif self.is_float:
+            return np.array(raw, dtype=np.float32)
+        else:
+            return raw.astype(np.float32) / 2147483648.0
+
+class SpectrogramCache:
+    """On-disk spectrogram cache keyed on audio content and STFT parameters
+
+    Each entry is a .npy of the dB matrix (loaded memory-mapped) plus a
+    small .npz of the axes. Hits refresh the entry's mtime. Once the cache
+    exceeds max_bytes the least recently used entries are removed down to
+    low_water * max_bytes, so the directory is only scanned again after
+    that much has been added.
+    """
+    def __init__(self, cache_dir='.spectrogram_cache', max_bytes=1024**3, low_water=0.9):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._size = None  # bytes at the last scan plus those put since
+        self._hashes = {}  # (path, size, mtime) -> content hash
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def content_hash(self, filename):
+        st = os.stat(filename)
+        memo_key = (os.path.abspath(filename), st.st_size, st.st_mtime_ns)
+        if memo_key not in self._hashes:
+            h = hashlib.blake2b(digest_size=20)
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            self._hashes[memo_key] = h.hexdigest()
+        return self._hashes[memo_key]
+    
+    def key(self, filename, nfft, overlap, window='hann', dtype=np.float64):
+        params = f"{nfft}-{overlap!r}-{window}-{np.dtype(dtype).name}"
+        return f"{self.content_hash(filename)}-{params}"
+    
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.npy', base + '.axes.npz'
+    
+    def get(self, key):
+        spec_path, axes_path = self._paths(key)
+        try:
+            spectrogram_db = np.load(spec_path, mmap_mode='r')
+            with np.load(axes_path) as axes:
+                time_axis, freq_axis = axes['time'], axes['freq']
+            os.utime(spec_path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return spectrogram_db, time_axis, freq_axis
+    
+    def put(self, key, spectrogram_db, time_axis, freq_axis):
+        spec_path, axes_path = self._paths(key)
+        # Write under temporary names so concurrent readers never see partial files
+        tmp = f"{spec_path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, spectrogram_db)
+        with open(tmp + '.npz', 'wb') as f:
+            np.savez(f, time=time_axis, freq=freq_axis)
+        os.replace(tmp + '.npz', axes_path)
+        os.replace(tmp, spec_path)
+        if self._size is None:
+            self.evict()
+            return
+        self._size += os.path.getsize(spec_path) + os.path.getsize(axes_path)
+        if self._size > self.max_bytes:
+            self.evict()
+    
+    def evict(self):
+        """Scan the cache and remove LRU entries if it is over max_bytes"""
+        entries = []
+        for spec_path in glob.glob(os.path.join(self.cache_dir, '*.npy')):
+            axes_path = spec_path[:-len('.npy')] + '.axes.npz'
+            try:
+                st = os.stat(spec_path)
+                size = st.st_size + os.path.getsize(axes_path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, size, spec_path, axes_path))
+        
+        total = sum(e[1] for e in entries)
+        if total > self.max_bytes:
+            for _, size, spec_path, axes_path in sorted(entries):
+                if total <= self.low_water * self.max_bytes:
+                    break
+                for path in (spec_path, axes_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+        self._size = total
 
 class EpsilonSpectrogramVisualizer:
-    def __init__(self, sample_rate=44100):
+    def __init__(self, sample_rate=44100, cache=None, image_only=False):
         self.sample_rate = sample_rate
+        self.cache = cache  # optional SpectrogramCache
+        self.image_only = image_only  # save bare spectrogram images, no axes
+        self.renderer = rendering.SpectrogramRenderer()
         
-    def read_wav_file(self, filename):
-        """Read WAV file and return audio data"""
-        with wave.open(filename, 'rb') as wav_file:
-            # Get audio parameters
-            n_channels = wav_file.getnchannels()
-            samp_width = wav_file.getsampwidth()
-            frame_rate = wav_file.getframerate()
-            n_frames = wav_file.getnframes()
-            
-            # Read audio data
-            frames = wav_file.readframes(n_frames)
-            
-            # Convert to numpy array based on sample width
-            if samp_width == 1:  # 8-bit
-                data = np.frombuffer(frames, dtype=np.uint8) - 128
-                data = data.astype(np.float32) / 128.0
-            elif samp_width == 2:  # 16-bit
-                data = np.frombuffer(frames, dtype=np.int16)
-                data = data.astype(np.float32) / 32768.0
-            elif samp_width == 3:  # 24-bit
-                # Handle 24-bit data
-                data = np.frombuffer(frames, dtype=np.uint8)
-                data = data.reshape(-1, 3)
-                data = ((data[:, 2] << 16) | (data[:, 1] << 8) | data[:, 0])
-                data = data.astype(np.float32) / 8388608.0
-            else:  # 32-bit or other
-                data = np.frombuffer(frames, dtype=np.int32)
-                data = data.astype(np.float32) / 2147483648.0
-            
-            # Handle stereo files by taking only first channel
-            if n_channels > 1:
-                data = data[::n_channels]
-                
-            return data, frame_rate
+    def read_wav_file(self, filename, lazy=False):
+        """Read WAV file and return audio data
+
+        With lazy=True the data is returned as a memory-mapped PCMWavData,
+        which create_spectrogram decodes block by block.
+        """
+        data = PCMWavData(filename)
+        if lazy:
+            return data, data.frame_rate
+        return data[:], data.frame_rate
     
-    def create_spectrogram(self, audio_data, sample_rate, nfft=1024, overlap=0.75):
-        """Create spectrogram using manual STFT calculation"""
+    def create_spectrogram(self, audio_data, sample_rate, nfft=1024, overlap=0.75,
+                           dtype=np.float64, frames_per_block=256):
+        """Create spectrogram from a strided frame view with batched FFTs
+
+        Frames are transformed frames_per_block at a time to bound the size
+        of the temporaries; dtype=np.float32 computes in float32/complex64.
+        audio_data may be an array or a lazily decoded PCMWavData.
+        """
         hop_length = int(nfft * (1 - overlap))
-        window = np.hanning(nfft)
+        window = np.hanning(nfft).astype(dtype)
         
         # Calculate number of frames
-        n_frames = 1 + (len(audio_data) - nfft) // hop_length
+        n_frames = max(1 + (len(audio_data) - nfft) // hop_length, 0)
         
         # Initialize spectrogram matrix
-        spectrogram = np.zeros((nfft // 2 + 1, n_frames))
-        
-        # Compute STFT
-        for i in range(n_frames):
-            start = i * hop_length
-            end = start + nfft
-            
-            if end > len(audio_data):
-                break
-                
-            # Apply window and compute FFT
-            frame = audio_data[start:end] * window
-            spectrum = np.fft.rfft(frame)
-            magnitude = np.abs(spectrum)
-            
-            # Store in spectrogram
-            spectrogram[:, i] = magnitude
+        spectrogram = np.zeros((nfft // 2 + 1, n_frames), dtype=dtype)
+        
+        # Compute STFT over zero-copy (frames, nfft) views of each block
+        for start in range(0, n_frames, frames_per_block):
+            end = min(start + frames_per_block, n_frames)
+            segment = audio_data[start * hop_length:(end - 1) * hop_length + nfft]
+            frames = np.lib.stride_tricks.sliding_window_view(segment, nfft)[::hop_length]
+            spectrum = np.fft.rfft(frames * window, axis=1)
+            spectrogram[:, start:end] = np.abs(spectrum).T
         
         # Convert to dB scale
-        spectrogram_db = 20 * np.log10(spectrogram + 1e-10)
+        spectrogram += 1e-10
+        spectrogram_db = np.log10(spectrogram, out=spectrogram)
+        spectrogram_db *= 20
         
         # Time and frequency axes
         time_axis = np.arange(n_frames) * hop_length / sample_rate
@@ -80,6 +238,27 @@ class EpsilonSpectrogramVisualizer:
         
         return spectrogram_db, time_axis, freq_axis
     
+    def file_spectrogram(self, filename, nfft=1024, overlap=0.75, dtype=np.float64):
+        """Read a WAV file lazily and return (audio_data, spectrogram_db, time_axis, freq_axis)
+
+        The STFT is skipped when the cache already holds the result for the
+        same audio content and parameters.
+        """
+        audio_data, sample_rate = self.read_wav_file(filename, lazy=True)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(filename, nfft, overlap, 'hann', dtype)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return (audio_data,) + cached
+        
+        spectrogram_db, time_axis, freq_axis = self.create_spectrogram(
+            audio_data, sample_rate, nfft=nfft, overlap=overlap, dtype=dtype
+        )
+        if key is not None:
+            self.cache.put(key, spectrogram_db, time_axis, freq_axis)
+        return audio_data, spectrogram_db, time_axis, freq_axis
+    
     def plot_spectrogram(self, spectrogram_db, time_axis, freq_axis, title="Spectrogram"):
         """Plot the spectrogram"""
         plt.figure(figsize=(12, 8))
@@ -100,56 +279,85 @@ class EpsilonSpectrogramVisualizer:
         
         return plt
     
-    def analyze_epsilon_echo(self, filename):
-        """Complete analysis of an epsilon echo WAV file"""
+    def analyze_epsilon_echo(self, filename, show=True, nfft=2048, overlap=0.8):
+        """Complete analysis of an epsilon echo WAV file
+
+        The plot is shown only when show is set and the backend is
+        interactive; otherwise it is rendered off-screen on a figure that is
+        reused from file to file.
+        """
         print(f"Analyzing: {filename}")
         
-        # Read audio file
-        audio_data, sample_rate = self.read_wav_file(filename)
+        # Read audio file and create spectrogram (cached when enabled)
+        audio_data, spectrogram_db, time_axis, freq_axis = self.file_spectrogram(
+            filename, nfft=nfft, overlap=overlap
+        )
+        sample_rate = audio_data.frame_rate
         duration = len(audio_data) / sample_rate
         
         print(f"Duration: {duration:.2f} seconds")
         print(f"Sample rate: {sample_rate} Hz")
         print(f"Number of samples: {len(audio_data)}")
         
-        # Create spectrogram
-        spectrogram_db, time_axis, freq_axis = self.create_spectrogram(
-            audio_data, sample_rate, nfft=2048, overlap=0.8
-        )
-        
-        # Plot
+        # Plot and save
         title = f"Epsilon Meteor Echo Spectrogram\n{os.path.basename(filename)}"
-        plot = self.plot_spectrogram(spectrogram_db, time_axis, freq_axis, title)
-        
-        # Save plot
         output_filename = os.path.splitext(filename)[0] + '_spectrogram.png'
-        plot.savefig(output_filename, dpi=150, bbox_inches='tight')
+        if self.image_only:
+            rendering.save_spectrogram_image(output_filename, spectrogram_db, freq_axis,
+                                             fmax=self.renderer.fmax)
+        elif show and rendering.is_interactive():
+            plot = self.plot_spectrogram(spectrogram_db, time_axis, freq_axis, title)
+            plot.savefig(output_filename, dpi=150, bbox_inches='tight')
+            plot.show()
+        else:
+            self.renderer.render(spectrogram_db, time_axis, freq_axis, title, output_filename)
         print(f"Spectrogram saved as: {output_filename}")
         
-        plot.show()
-        
         return audio_data, spectrogram_db, time_axis, freq_axis
     
-    def batch_process_files(self, file_pattern="epsilon_echo_*.wav"):
-        """Process multiple WAV files"""
+    def batch_process_files(self, file_pattern="epsilon_echo_*.wav", jobs=1):
+        """Process multiple WAV files
+
+        Plots are saved without being shown. With jobs > 1 the files are
+        spread over a process pool rendering with the Agg backend. Returns
+        a list of (filename, seconds, error or None).
+        """
         wav_files = glob.glob(file_pattern)
         
         if not wav_files:
             print(f"No files found matching pattern: {file_pattern}")
-            return
+            return []
         
         print(f"Found {len(wav_files)} WAV files to process:")
         for file in wav_files:
             print(f"  - {file}")
         
-        for file in wav_files:
-            try:
-                self.analyze_epsilon_echo(file)
-            except Exception as e:
-                print(f"Error processing {file}: {e}")
+        start = time.perf_counter()
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                     initargs=(self.sample_rate, self.cache,
+                                               self.image_only)) as pool:
+                results = list(pool.map(_analyze_batch_file, wav_files))
+        else:
+            results = [_analyze_batch_file(file, self) for file in wav_files]
+        elapsed = time.perf_counter() - start
+        
+        failed = [r for r in results if r[2] is not None]
+        print(f"\nBatch summary: {len(results)} files, {len(failed)} failed, "
+              f"{elapsed:.2f} s wall time ({jobs} job{'s' if jobs > 1 else ''})")
+        for file, seconds, error in results:
+            status = f"ERROR: {error}" if error else "ok"
+            print(f"  {seconds:8.2f} s  {file}  {status}")
+        
+        return results
     
-    def create_comparison_plot(self, filenames, output_file="epsilon_comparison.png"):
-        """Create comparison plot of multiple spectrograms"""
+    def create_comparison_plot(self, filenames, output_file="epsilon_comparison.png",
+                               nfft=2048, overlap=0.8):
+        """Create comparison plot of multiple spectrograms
+
+        The STFT parameters default to those of analyze_epsilon_echo, so
+        files already analyzed come from the cache.
+        """
         n_files = len(filenames)
         fig, axes = plt.subplots(n_files, 1, figsize=(12, 4 * n_files))
         
@@ -158,10 +366,8 @@ class EpsilonSpectrogramVisualizer:
         
         for i, filename in enumerate(filenames):
             try:
-                audio_data, sample_rate = self.read_wav_file(filename)
-                spectrogram_db, time_axis, freq_axis = self.create_spectrogram(
-                    audio_data, sample_rate
-                )
+                _, spectrogram_db, time_axis, freq_axis = self.file_spectrogram(
+                    filename, nfft=nfft, overlap=overlap)
                 
                 extent = [time_axis[0], time_axis[-1], freq_axis[0], freq_axis[-1]]
                 im = axes[i].imshow(spectrogram_db, aspect='auto', origin='lower',
@@ -185,20 +391,55 @@ class EpsilonSpectrogramVisualizer:
         plt.tight_layout()
         plt.savefig(output_file, dpi=150, bbox_inches='tight')
         print(f"Comparison plot saved as: {output_file}")
-        plt.show()
+        rendering.show(fig)
+
+_batch_visualizer = None
+
+def _init_batch_worker(sample_rate, cache, image_only):
+    """Process pool initializer: headless rendering, one visualizer per worker"""
+    global _batch_visualizer
+    rendering.select_backend(headless=True)
+    _batch_visualizer = EpsilonSpectrogramVisualizer(sample_rate, cache, image_only)
+
+def _analyze_batch_file(filename, visualizer=None):
+    """Analyze one file for batch_process_files; returns (filename, seconds, error)"""
+    visualizer = visualizer or _batch_visualizer
+    start = time.perf_counter()
+    try:
+        visualizer.analyze_epsilon_echo(filename, show=False)
+        error = None
+    except Exception as e:
+        print(f"Error processing {filename}: {e}")
+        error = str(e)
+    return filename, time.perf_counter() - start, error
 
 def main():
+    parser = argparse.ArgumentParser(description='Epsilon Meteor Echo Spectrogram Visualizer')
+    parser.add_argument('--pattern', type=str, default='epsilon_echo_*.wav', help='WAV files to batch process')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes for batch processing')
+    parser.add_argument('--cache-dir', type=str, default='.spectrogram_cache', help='Spectrogram cache directory')
+    parser.add_argument('--cache-size-mb', type=float, default=1024, help='Spectrogram cache size limit in MB')
+    parser.add_argument('--no-cache', action='store_true', help='Always recompute spectrograms')
+    parser.add_argument('--headless', action='store_true', help='Never open plot windows (default when no display)')
+    parser.add_argument('--image-only', action='store_true', help='Save bare spectrogram images without axes')
+    args = parser.parse_args()
+    
+    rendering.select_backend(headless=args.headless or None)
+    
     # Initialize visualizer
-    visualizer = EpsilonSpectrogramVisualizer()
+    cache = None
+    if not args.no_cache:
+        cache = SpectrogramCache(args.cache_dir, int(args.cache_size_mb * 1024**2))
+    visualizer = EpsilonSpectrogramVisualizer(cache=cache, image_only=args.image_only)
     
     # Process single file
     visualizer.analyze_epsilon_echo('epsilon_meteor_echo.wav')
     
     # Process all epsilon echo files
-    visualizer.batch_process_files("epsilon_echo_*.wav")
+    visualizer.batch_process_files(args.pattern, jobs=args.jobs)
     
     # Create comparison plot of first few files
-    epsilon_files = glob.glob("epsilon_echo_*.wav")[:3]  # First 3 files
+    epsilon_files = glob.glob(args.pattern)[:3]  # First 3 files
     if epsilon_files:
         visualizer.create_comparison_plot(epsilon_files, "epsilon_echoes_comparison.png")
 
@@ -1,9 +1,14 @@
-import random
+import math
+import threading
+import time
+import numpy as np
 from gnuradio import gr
 import pmt
 
 class blk(gr.sync_block):
-    def __init__(self):
+    """Random Doppler updates on freq_out at a fixed rate, from a timer thread"""
+
+    def __init__(self, rate=10.0, low=-10.0, high=10.0, seed=None):
         gr.sync_block.__init__(
             self,
             name="RandomFreqUpdater",
@@ -14,21 +19,81 @@ class blk(gr.sync_block):
         # Add a message output port
         self.message_port_register_out(pmt.intern("freq_out"))
 
-        self.counter = 0
+        self.rate = rate                  # updates per second
+        self.low = low                    # Doppler range, Hz
+        self.high = high
         self.current_freq = 0
+        self.rng = np.random.default_rng(seed)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    # A block without stream ports never has work() called, so updates
+    # come from a thread started and stopped with the flowgraph
+    def start(self):
+        self._reset_stats()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="RandomFreqUpdater",
+                                        daemon=True)
+        self._thread.start()
+        return True
 
-    def work(self, input_items, output_items):
-        self.counter += 1
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return True
 
-        if self.counter % 100 == 0:   # update periodically
-            self.current_freq = random.uniform(-10, 10)
-            self.set_var("dShift", self.current_freq)
+    def _run(self):
+        # Deadlines sit on a fixed grid from the start time, so sleep
+        # overshoot shows up as latency instead of drifting the rate
+        deadline = time.monotonic() + 1.0 / self.rate
+        while not self._stop_event.wait(max(deadline - time.monotonic(), 0.0)):
+            self.current_freq = self.rng.uniform(self.low, self.high)
 
             # publish as PMT float
             self.message_port_pub(
                 pmt.intern("freq_out"),
                 pmt.from_double(self.current_freq)
             )
+            now = time.monotonic()
+            self._record(now - deadline)
+
+            period = 1.0 / self.rate
+            deadline += period
+            if deadline <= now:
+                # Fell more than a period behind: skip the missed slots
+                # rather than publishing a burst to catch up
+                missed = math.ceil((now - deadline) / period)
+                deadline += missed * period
+                with self._lock:
+                    self._missed += missed
+
+    def _reset_stats(self):
+        with self._lock:
+            self._count = 0
+            self._mean = 0.0
+            self._m2 = 0.0
+            self._max = 0.0
+            self._missed = 0
 
-        return 0
+    def _record(self, latency):
+        with self._lock:
+            self._count += 1
+            delta = latency - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (latency - self._mean)
+            self._max = max(self._max, latency)
 
+    def latency_stats(self):
+        """
+        Lateness of published updates against their scheduled times, in
+        seconds: count, mean, std (jitter), max, and missed update slots
+        """
+        with self._lock:
+            std = math.sqrt(self._m2 / self._count) if self._count else 0.0
+            return {'count': self._count, 'mean': self._mean, 'std': std,
+                    'max': self._max, 'missed': self._missed}
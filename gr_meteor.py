@@ -25,7 +25,9 @@ from PyQt5 import Qt
 from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 import gr_meteor_epy_block_0 as epy_block_0  # embedded python block
+import gr_meteor_epy_block_1 as epy_block_1  # embedded python block
 import numpy as np
+import echo_models
 import sip
 
 
@@ -200,8 +202,8 @@ class gr_meteor(gr.top_block, Qt.QWidget):
             self.display_grid_layout_0.setColumnStretch(c, 1)
         self.freq_xlating_fir_filter_xxx_0_1 = filter.freq_xlating_fir_filter_ccc(1, firdes.complex_band_pass(1, samp_rate, -samp_rate/(2), samp_rate/(2), 10), 0, samp_rate)
         self.freq_xlating_fir_filter_xxx_0_1.set_block_alias("doppler_shift")
-        self.epy_block_0 = epy_block_0.blk()
-        self.blocks_vector_source_x_0_0 = blocks.vector_source_c(([0.0]*int(ud_spacing*samp_rate) + [np.exp(x/(riseFracc*ud_samples)) for x in range(-int(riseFracc*ud_samples), 0)]+[np.exp(-x/((1-riseFracc)*ud_samples)) for x in range(0, int((1-riseFracc)*ud_samples))]), True, 1, [])
+        self.epy_block_1 = epy_block_1.blk(samp_rate=samp_rate, interval=ud_spacing, envelope=echo_models.underdense_template(samp_rate, ud_dur, riseFracc), poisson=True, seed=None)
+        self.epy_block_0 = epy_block_0.blk(period=12096, low=-25.0, high=25.0, seed=None)
         self.blocks_throttle2_0 = blocks.throttle( gr.sizeof_gr_complex*1, samp_rate, True, 0 if "auto" == "auto" else max( int(float(0.1) * samp_rate) if "auto" == "time" else int(0.1), 1) )
         self.blocks_null_sink_1 = blocks.null_sink(gr.sizeof_float*1)
         self.blocks_nlog10_ff_1 = blocks.nlog10_ff(1, 1, 0)
@@ -230,8 +232,8 @@ class gr_meteor(gr.top_block, Qt.QWidget):
         self.connect((self.blocks_nlog10_ff_1, 0), (self.qtgui_time_sink_x_0, 0))
         self.connect((self.blocks_throttle2_0, 0), (self.blocks_complex_to_mag_squared_1, 0))
         self.connect((self.blocks_throttle2_0, 0), (self.qtgui_sink_x_0, 0))
-        self.connect((self.blocks_vector_source_x_0_0, 0), (self.blocks_multiply_xx_0, 1))
         self.connect((self.epy_block_0, 0), (self.blocks_null_sink_1, 0))
+        self.connect((self.epy_block_1, 0), (self.blocks_multiply_xx_0, 1))
         self.connect((self.freq_xlating_fir_filter_xxx_0_1, 0), (self.blocks_add_xx_0, 1))
 
 
@@ -249,6 +251,7 @@ class gr_meteor(gr.top_block, Qt.QWidget):
     def set_ud_dur(self, ud_dur):
         self.ud_dur = ud_dur
         self.set_ud_samples(self.samp_rate*self.ud_dur)
+        self.epy_block_1.envelope = echo_models.underdense_template(self.samp_rate, self.ud_dur, self.riseFracc)
 
     def get_samp_rate(self):
         return self.samp_rate
@@ -259,7 +262,8 @@ class gr_meteor(gr.top_block, Qt.QWidget):
         self.set_ud_samples(self.samp_rate*self.ud_dur)
         self.analog_sig_source_x_0.set_sampling_freq(self.samp_rate)
         self.blocks_throttle2_0.set_sample_rate(self.samp_rate)
-        self.blocks_vector_source_x_0_0.set_data(([0.0]*int(self.ud_spacing*self.samp_rate) + [np.exp(x/(self.riseFracc*self.ud_samples)) for x in range(-int(self.riseFracc*self.ud_samples), 0)]+[np.exp(-x/((1-self.riseFracc)*self.ud_samples)) for x in range(0, int((1-self.riseFracc)*self.ud_samples))]), [])
+        self.epy_block_1.envelope = echo_models.underdense_template(self.samp_rate, self.ud_dur, self.riseFracc)
+        self.epy_block_1.samp_rate = self.samp_rate
         self.freq_xlating_fir_filter_xxx_0_1.set_taps(firdes.complex_band_pass(1, self.samp_rate, -self.samp_rate/(2), self.samp_rate/(2), 10))
         self.qtgui_sink_x_0.set_frequency_range(self.beacon_freq, self.samp_rate)
         self.qtgui_time_sink_x_0.set_samp_rate(self.samp_rate)
@@ -269,14 +273,13 @@ class gr_meteor(gr.top_block, Qt.QWidget):
 
     def set_ud_spacing(self, ud_spacing):
         self.ud_spacing = ud_spacing
-        self.blocks_vector_source_x_0_0.set_data(([0.0]*int(self.ud_spacing*self.samp_rate) + [np.exp(x/(self.riseFracc*self.ud_samples)) for x in range(-int(self.riseFracc*self.ud_samples), 0)]+[np.exp(-x/((1-self.riseFracc)*self.ud_samples)) for x in range(0, int((1-self.riseFracc)*self.ud_samples))]), [])
+        self.epy_block_1.interval = self.ud_spacing
 
     def get_ud_samples(self):
         return self.ud_samples
 
     def set_ud_samples(self, ud_samples):
         self.ud_samples = ud_samples
-        self.blocks_vector_source_x_0_0.set_data(([0.0]*int(self.ud_spacing*self.samp_rate) + [np.exp(x/(self.riseFracc*self.ud_samples)) for x in range(-int(self.riseFracc*self.ud_samples), 0)]+[np.exp(-x/((1-self.riseFracc)*self.ud_samples)) for x in range(0, int((1-self.riseFracc)*self.ud_samples))]), [])
 
     def get_samp_rate_label(self):
         return self.samp_rate_label
@@ -290,7 +293,7 @@ class gr_meteor(gr.top_block, Qt.QWidget):
 
     def set_riseFracc(self, riseFracc):
         self.riseFracc = riseFracc
-        self.blocks_vector_source_x_0_0.set_data(([0.0]*int(self.ud_spacing*self.samp_rate) + [np.exp(x/(self.riseFracc*self.ud_samples)) for x in range(-int(self.riseFracc*self.ud_samples), 0)]+[np.exp(-x/((1-self.riseFracc)*self.ud_samples)) for x in range(0, int((1-self.riseFracc)*self.ud_samples))]), [])
+        self.epy_block_1.envelope = echo_models.underdense_template(self.samp_rate, self.ud_dur, self.riseFracc)
 
     def get_noiseLevel(self):
         return self.noiseLevel
@@ -1,28 +1,38 @@
-import random
 import numpy as np
 from gnuradio import gr
 import pmt
 
 class blk(gr.sync_block):
-    def __init__(self):
+    """Piecewise-constant random dShift, published on freq_out at each change"""
+
+    def __init__(self, period=12096, low=-25.0, high=25.0, seed=None):
         gr.sync_block.__init__(
             self,
             name="Random dShift Publisher",
             in_sig=None,
             out_sig=[np.float32]   # optional float output stream
         )
+        self.period = period       # samples between updates
+        self.low = low             # dShift range, Hz
+        self.high = high
         self.counter = 0
         self.current_val = 0.0
+        self.rng = np.random.default_rng(seed)
 
         # Message output port for variable updates
         self.message_port_register_out(pmt.intern("freq_out"))
 
     def work(self, input_items, output_items):
         out = output_items[0]
+        n = len(out)
 
-        for i in range(len(out)):
-            if self.counter % 12096 == 0:
-                self.current_val = random.uniform(-25, 25)
+        # One slice fill per constant run; a new value starts wherever
+        # counter is a multiple of period
+        pos = 0
+        while pos < n:
+            phase = self.counter % self.period
+            if phase == 0:
+                self.current_val = self.rng.uniform(self.low, self.high)
 
                 # Build PMT pair: (variable name, value)
                 msg = pmt.cons(
@@ -36,8 +46,9 @@ class blk(gr.sync_block):
                 # Print to terminal
                 # print(f"[Random dShift Publisher] dShift = {self.current_val:.3f}")
 
-            out[i] = self.current_val
-            self.counter += 1
-
-        return len(out)
+            run = min(self.period - phase, n - pos)
+            out[pos:pos + run] = self.current_val
+            self.counter += run
+            pos += run
 
+        return n
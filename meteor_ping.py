@@ -2,30 +2,34 @@
 import numpy as np
 import soundfile as sf
 import argparse
+from echo_models import ping_profiles, ping_carrier, headroom_peak
 
 def generate_meteor_ping(duration=1.0, sample_rate=44100, 
                         center_freq=1000, doppler_shift=200,
-                        amplitude_decay=0.5, noise_level=0.1):
+                        amplitude_decay=0.5, noise_level=0.1, seed=None,
+                        normalize='peak', oscillator='exact', dtype=np.float64):
     """
-    Generate a realistic meteor ping simulation
+    Generate a realistic meteor ping simulation, scaled to its 'peak' or a fixed 'headroom'
     """
+    rng = np.random.default_rng(seed)
     t = np.linspace(0, duration, int(sample_rate * duration))
     
-    # Exponential amplitude decay (simulating trail dissipation)
-    amplitude = np.exp(-t / amplitude_decay)
-    
-    # Time-varying Doppler shift (simulating trail evolution)
-    doppler = doppler_shift * np.exp(-t / (duration * 0.5))
+    amplitude, doppler = ping_profiles(t, duration, doppler_shift, amplitude_decay)
     
     # Generate the signal
-    signal = amplitude * np.sin(2 * np.pi * (center_freq + doppler) * t)
+    signal = (amplitude * ping_carrier(t, center_freq, doppler, sample_rate, oscillator)).astype(dtype, copy=False)
     
     # Add noise
-    noise = noise_level * np.random.randn(len(t))
+    noise = noise_level * rng.standard_normal(len(t), dtype=dtype)
     signal += noise
     
     # Normalize
-    signal = 0.9 * signal / np.max(np.abs(signal))
+    if normalize == 'headroom':
+        signal *= 0.9 / headroom_peak(1.0, noise_level)
+    elif normalize == 'peak':
+        signal = 0.9 * signal / np.max(np.abs(signal))
+    else:
+        raise ValueError(f"unknown normalize mode: {normalize}")
     
     return signal, sample_rate
 
@@ -35,13 +39,23 @@ def main():
     parser.add_argument('--output', type=str, default='meteor_ping.wav', help='Output filename')
     parser.add_argument('--freq', type=float, default=1000, help='Center frequency in Hz')
     parser.add_argument('--doppler', type=float, default=200, help='Maximum Doppler shift in Hz')
+    parser.add_argument('--seed', type=int, default=None, help='RNG seed for reproducible runs')
+    parser.add_argument('--normalize', choices=['peak', 'headroom'], default='peak', help='Output scaling')
+    parser.add_argument('--oscillator', choices=['exact', 'nco'], default='exact',
+                        help='Carrier from np.sin (float64) or the float32 NCO')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='Sample type of the generated ping')
     
     args = parser.parse_args()
     
     signal, sr = generate_meteor_ping(
         duration=args.duration,
         center_freq=args.freq,
-        doppler_shift=args.doppler
+        doppler_shift=args.doppler,
+        seed=args.seed,
+        normalize=args.normalize,
+        oscillator=args.oscillator,
+        dtype=args.dtype
     )
     
     sf.write(args.output, signal, sr)
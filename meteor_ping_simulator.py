@@ -2,8 +2,15 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import wave, struct
+import argparse
+import json
+import rendering
+from nco import NCO
+from echo_models import (underdense_envelope, underdense_span, raised_cosine_window,
+                         doppler_phase, poisson_arrival_blocks, thinned_arrival_blocks,
+                         shower_rate, headroom_peak)
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Callable
 
 @dataclass
 class SimConfig:
@@ -12,96 +19,373 @@ class SimConfig:
     f0: float = 1000.0
     snr_db: float = -5.0
     event_rate_hz: float = 0.5
+    event_rate_fn: Optional[Callable] = None  # time-varying rate (events/s), at most event_rate_hz
     p_overdense: float = 0.35
     tau_underdense_s: Tuple[float, float] = (0.03, 0.12)
     overdense_dur_s: Tuple[float, float] = (0.2, 1.2)
     fd_hz: Tuple[float, float] = (-150.0, 150.0)
     fd_slope_hz_s: Tuple[float, float] = (-300.0, 300.0)
     fd_curve_hz_s2: Tuple[float, float] = (-400.0, 400.0)
+    env_floor_db: float = -120.0
+    oscillator: str = 'exact'  # or 'nco': float32 carrier from the NCO
+    dtype: str = 'float64'  # or 'float32': sample type of the run, as the flowgraphs read it
+    noise_dtype: str = 'float64'  # or 'float32': faster normals for the AWGN stage
+    signal_power: str = 'measured'  # or 'analytic': SNR reference from event_energy
     nfft: int = 1024
     noverlap: int = 768
 
-def poisson_event_times(rate_hz: float, T: float, rng: np.random.Generator):
-    times = []
-    t = 0.0
+def event_time_blocks(rate_hz: float, T: float, rng: np.random.Generator,
+                      rate_fn: Optional[Callable] = None):
+    """
+    Onset times in [0, T), yielded in blocks: homogeneous at rate_hz, or with
+    rate_fn (an array of times -> events/s, at most rate_hz) by thinning.
+    """
+    if rate_fn is not None:
+        return thinned_arrival_blocks(rate_fn, rate_hz, T, rng)
+    return poisson_arrival_blocks(rate_hz, T, rng)
+
+def poisson_event_times(rate_hz: float, T: float, rng: np.random.Generator,
+                        rate_fn: Optional[Callable] = None):
+    """All of event_time_blocks in one array."""
+    return np.concatenate(list(event_time_blocks(rate_hz, T, rng, rate_fn)))
+
+EVENT_DTYPE = np.dtype([
+    ('t0', 'f8'),
+    ('overdense', '?'),
+    ('width_s', 'f8'),  # overdense duration or underdense tau
+    ('fd0', 'f8'),
+    ('fd1', 'f8'),
+    ('fd2', 'f8'),
+    ('A', 'f8'),
+    ('i0', 'i8'),       # active samples [i0, i1) of the run
+    ('i1', 'i8'),
+])
+
+def _event_window(cfg, N, t0, span):
+    """Sample ranges [i0, i1) with 0 <= t - t0 <= span, clipped to the run."""
+    i0 = np.maximum(np.floor(t0 * cfg.fs).astype(np.int64), 0)
+    i0 += i0 / cfg.fs - t0 < 0
+    i1 = np.maximum(np.ceil((t0 + span) * cfg.fs).astype(np.int64) + 1, i0)
     while True:
-        dt = rng.exponential(1.0 / max(rate_hz, 1e-9))
-        t += dt
-        if t >= T:
+        late = (i1 > i0) & ((i1 - 1) / cfg.fs - t0 > span)
+        if not late.any():
             break
-        times.append(t)
-    return times
-
-def underdense_envelope(t, tau):
-    env = np.exp(-np.clip(t, 0, None) / max(tau, 1e-6))
-    env[t < 0] = 0.0
-    return env
-
-def raised_cosine_window(N, frac=0.05):
-    N = max(N, 1)
-    ramp = max(int(frac * N), 1)
-    w = np.ones(N, dtype=float)
-    for i in range(ramp):
-        w[i] = 0.5 - 0.5 * np.cos(np.pi * (i + 1) / ramp)
-        w[-(i + 1)] = 0.5 - 0.5 * np.cos(np.pi * (i + 1) / ramp)
-    return w
-
-def overdense_envelope(t, dur):
-    env = np.zeros_like(t, dtype=float)
-    idx = np.where((t >= 0) & (t <= dur))[0]
-    if len(idx) == 0:
-        return env
-    env[idx] = raised_cosine_window(len(idx), 0.05)
-    return env
-
-def doppler_phase(t, fd0, fd1, fd2):
-    return 2 * np.pi * (fd0 * t + 0.5 * fd1 * t**2 + (1.0/6.0) * fd2 * t**3)
-
-def synth_event(cfg, t, t0, rng):
-    te = t - t0
-    if rng.random() < cfg.p_overdense:
-        dur = rng.uniform(*cfg.overdense_dur_s)
-        env = overdense_envelope(te, dur)
+        i1 -= late
+    return np.minimum(i0, N), np.minimum(i1, N)
+
+def draw_events_at(cfg, N, starts, rng):
+    """Draw the parameters of events starting at starts within an N-sample run."""
+    n = len(starts)
+    ev = np.zeros(n, dtype=EVENT_DTYPE)
+    ev['t0'] = starts
+    ev['overdense'] = rng.random(n) < cfg.p_overdense
+    u = rng.random(n)
+    od, ud = ev['overdense'], ~ev['overdense']
+    ev['width_s'][od] = cfg.overdense_dur_s[0] + (cfg.overdense_dur_s[1] - cfg.overdense_dur_s[0]) * u[od]
+    ev['width_s'][ud] = cfg.tau_underdense_s[0] + (cfg.tau_underdense_s[1] - cfg.tau_underdense_s[0]) * u[ud]
+    ev['fd0'] = rng.uniform(*cfg.fd_hz, n)
+    ev['fd1'] = rng.uniform(*cfg.fd_slope_hz_s, n)
+    ev['fd2'] = rng.uniform(*cfg.fd_curve_hz_s2, n)
+    ev['A'] = 10**(rng.uniform(-10, 0, n)/20.0)
+    # Overdense trails span [0, dur]; underdense ones end below the floor
+    span = np.where(od, ev['width_s'], underdense_span(ev['width_s'], cfg.env_floor_db))
+    ev['i0'], ev['i1'] = _event_window(cfg, N, starts, span)
+    return ev
+
+def draw_event(cfg, N, t0, rng):
+    """Draw the parameters of one event starting at t0 within an N-sample run."""
+    return draw_events_at(cfg, N, np.array([t0]), rng)[0]
+
+def event_blocks(cfg, N, rng):
+    """
+    Yield the events of an N-sample run as EVENT_DTYPE arrays, one block of
+    onsets at a time, drawing each block only when it is asked for.
+    """
+    for starts in event_time_blocks(cfg.event_rate_hz, cfg.dur_s, rng, cfg.event_rate_fn):
+        yield draw_events_at(cfg, N, starts, rng)
+
+def draw_events(cfg, N, rng):
+    """Onset times and parameters of every event in an N-sample run."""
+    return np.concatenate(list(event_blocks(cfg, N, rng)))
+
+def render_event(cfg, ev, x, offset=0):
+    """Add the part of ev that overlaps x into x, where x[0] is sample offset of the run."""
+    i0, i1 = int(ev['i0']), int(ev['i1'])
+    a = max(i0, offset)
+    b = min(i1, offset + len(x))
+    if a >= b:
+        return
+    t = np.arange(a, b) / cfg.fs
+    te = t - ev['t0']
+    if ev['overdense']:
+        env = raised_cosine_window(i1 - i0, 0.05)[a - i0:b - i0]
     else:
-        tau = rng.uniform(*cfg.tau_underdense_s)
-        env = underdense_envelope(te, tau)
-    fd0 = rng.uniform(*cfg.fd_hz)
-    fd1 = rng.uniform(*cfg.fd_slope_hz_s)
-    fd2 = rng.uniform(*cfg.fd_curve_hz_s2)
-    phi = doppler_phase(np.clip(te, 0, None), fd0, fd1, fd2)
-    carrier = np.cos(2*np.pi*cfg.f0*t + phi)
-    A = 10**(rng.uniform(-10, 0)/20.0)
-    return A*env*carrier
-
-def add_awgn(x, snr_db, rng):
-    sig_pwr = np.mean(x**2) + 1e-12
-    snr_lin = 10**(snr_db/10.0)
-    noise_pwr = sig_pwr / max(snr_lin, 1e-9)
-    n = rng.normal(0.0, np.sqrt(noise_pwr), size=x.shape)
-    return x + n
-
-def write_wav_int16(path, fs, x):
-    x = np.asarray(x, dtype=float)
-    maxv = np.max(np.abs(x)) + 1e-12
-    y = np.clip(x / maxv, -1.0, 1.0)
-    y = (y * 32767.0).astype(np.int16)
+        env = underdense_envelope(te, ev['width_s'])
+    phi = doppler_phase(np.clip(te, 0, None), ev['fd0'], ev['fd1'], ev['fd2'])
+    if cfg.oscillator == 'nco':
+        # The same phase: the NCO starts at sample a's and integrates the rest
+        cycles = cfg.f0*t + phi/(2*np.pi)
+        nco = NCO(cfg.fs, phase=2*np.pi*cycles[0])
+        carrier = nco.cos(freq=np.diff(cycles, prepend=cycles[0])*cfg.fs)
+    else:
+        carrier = np.cos(2*np.pi*cfg.f0*t + phi)
+    # The phase stays float64 whatever x holds; only the samples are rounded
+    x[a - offset:b - offset] += ev['A']*env*carrier
+
+def synth_event(cfg, N, t0, rng):
+    """
+    Synthesize one event starting at t0 within an N-sample run.
+
+    Only the samples where the envelope is above cfg.env_floor_db are
+    computed; returns (start index, samples) for the caller to add in place.
+    """
+    ev = draw_event(cfg, N, t0, rng)
+    seg = np.zeros(ev['i1'] - ev['i0'], dtype=cfg.dtype)
+    render_event(cfg, ev, seg, int(ev['i0']))
+    return int(ev['i0']), seg
+
+def stream_events(cfg, blocks, chunk_size=65536):
+    """
+    Yield the noiseless sum of events in chunks of chunk_size samples.
+
+    blocks is an iterable of EVENT_DTYPE arrays in onset order, as
+    event_blocks yields them; it is only read as far as the chunk being
+    rendered, and events still active at the end of a chunk carry over
+    into the next one.
+    """
+    N = int(cfg.fs * cfg.dur_s)
+    blocks = iter(blocks)
+    pending = np.zeros(0, dtype=EVENT_DTYPE)
+    active = pending
+    drawn = False
+    for c0 in range(0, N, chunk_size):
+        c1 = min(c0 + chunk_size, N)
+        while not drawn and (len(pending) == 0 or pending['i0'][-1] < c1):
+            block = next(blocks, None)
+            if block is None:
+                drawn = True
+            else:
+                pending = np.concatenate([pending, block])
+        k = np.searchsorted(pending['i0'], c1)
+        active = np.concatenate([active, pending[:k]])
+        pending = pending[k:]
+        x = np.zeros(c1 - c0, dtype=cfg.dtype)
+        for ev in active:
+            render_event(cfg, ev, x, c0)
+        active = active[active['i1'] > c1]
+        yield x
+
+def signal_power(x, chunk_size=65536):
+    """Mean square of x, accumulated chunk by chunk instead of squaring all of x at once."""
+    energy = 0.0
+    for i in range(0, len(x), chunk_size):
+        c = np.asarray(x[i:i + chunk_size], dtype=float)
+        energy += np.dot(c, c)
+    return energy / max(len(x), 1)
+
+def event_energy(cfg, ev):
+    """
+    Expected sum of squares of ev's samples, from its envelope alone: the
+    carrier contributes a factor of 1/2 on average.
+    """
+    n = int(ev['i1'] - ev['i0'])
+    if n <= 0:
+        return 0.0
+    if ev['overdense']:
+        w = raised_cosine_window(n, 0.05)
+        env2 = np.dot(w, w)
+    else:
+        # Geometric sum of exp(-2k/(tau*fs)) over the n active samples
+        q = np.exp(-2.0 / (max(ev['width_s'], 1e-6) * cfg.fs))
+        env2 = -np.expm1(n * np.log(q)) / -np.expm1(np.log(q))
+    return 0.5 * ev['A']**2 * env2
+
+class AWGNStage:
+    """
+    White noise at snr_db relative to sig_pwr, added to a signal chunk by chunk.
+
+    sig_pwr is the power of the whole noiseless run (signal_power of it, or
+    run_signal_power), so the noise level is the same for every chunk.
+    Normals are drawn into one preallocated buffer of chunk_size samples,
+    scaled and added in place; dtype=np.float32 takes the faster float32
+    path of Generator.standard_normal.
+    """
+    def __init__(self, snr_db, rng, sig_pwr, dtype=np.float64, chunk_size=65536):
+        self.rng = rng
+        snr_lin = 10**(snr_db/10.0)
+        self.noise_std = np.sqrt((sig_pwr + 1e-12) / max(snr_lin, 1e-9))
+        self._buf = np.empty(chunk_size, dtype=dtype)
+
+    def process(self, x, out=None):
+        """Return x plus noise in out (pass x itself to add in place; default: a new array)."""
+        if out is None:
+            out = np.array(x, dtype=np.result_type(x, np.float32))
+        elif out is not x:
+            out[:] = x
+        for i in range(0, len(out), len(self._buf)):
+            noise = self._buf[:min(len(self._buf), len(out) - i)]
+            self.rng.standard_normal(dtype=noise.dtype, out=noise)
+            noise *= self.noise_std
+            out[i:i + len(noise)] += noise
+        return out
+
+def add_awgn(x, snr_db, rng, sig_pwr=None, out=None, dtype=np.float64, chunk_size=65536):
+    """
+    Add white noise at snr_db relative to sig_pwr (default: the power of x).
+
+    See AWGNStage; with out=x no signal-sized temporaries are allocated.
+    """
+    if sig_pwr is None:
+        sig_pwr = signal_power(x, chunk_size)
+    return AWGNStage(snr_db, rng, sig_pwr, dtype, chunk_size).process(x, out)
+
+def write_wav_int16_chunks(path, fs, chunks, peak):
+    """Write float chunks as 16-bit mono PCM, scaled so that peak maps to full scale."""
+    maxv = peak + 1e-12
     with wave.open(path, 'wb') as wf:
         wf.setnchannels(1)
         wf.setsampwidth(2)
         wf.setframerate(fs)
-        wf.writeframes(y.tobytes())
+        for x in chunks:
+            y = np.clip(np.asarray(x, dtype=float) / maxv, -1.0, 1.0)
+            y = (y * 32767.0).astype(np.int16)
+            wf.writeframes(y.tobytes())
+
+def write_wav_int16(path, fs, x, chunk_size=65536):
+    x = np.asarray(x)
+    chunks = (x[i:i + chunk_size] for i in range(0, len(x), chunk_size))
+    peak = max(float(np.max(x, initial=0.0)), -float(np.min(x, initial=0.0)))
+    write_wav_int16_chunks(path, fs, chunks, peak)
+
+def write_dat_float32(path, x, chunk_size=65536):
+    """Write x as raw float32, converting chunk_size samples at a time."""
+    with open(path, 'wb') as f:
+        for i in range(0, len(x), chunk_size):
+            np.asarray(x[i:i + chunk_size], dtype=np.float32).tofile(f)
+
+def write_peak_sidecar(path, peak, n_samples):
+    with open(path + '.peak.json', 'w') as f:
+        json.dump({'peak': float(peak), 'samples': int(n_samples)}, f)
+
+def read_peak_sidecar(path):
+    with open(path + '.peak.json') as f:
+        return json.load(f)['peak']
+
+def run_signal_power(cfg, blocks, N, chunk_size=65536):
+    """
+    Power of the noiseless run that the SNR refers to: measured by a first
+    pass over the event blocks, or summed from event_energy when
+    cfg.signal_power is 'analytic' (no rendering).
+    """
+    if cfg.signal_power == 'analytic':
+        return sum(event_energy(cfg, ev) for block in blocks for ev in block) / max(N, 1)
+    if cfg.signal_power != 'measured':
+        raise ValueError(f"unknown signal_power mode: {cfg.signal_power}")
+    energy = 0.0
+    for x in stream_events(cfg, blocks, chunk_size):
+        x = np.asarray(x, dtype=float)
+        energy += np.dot(x, x)
+    return energy / max(N, 1)
+
+def simulate_stream(cfg, rng, dat_path, wav_path, chunk_size=65536, normalize='two-pass'):
+    """
+    Run the simulation chunk by chunk, writing dat_path as it goes.
+
+    Memory use depends on chunk_size and the events active at once, not on
+    the run length: events come from event_blocks, drawn as the chunks
+    reach them from a stream spawned off rng (rng itself draws the noise).
+    The noise level needs the power of the whole run, which
+    run_signal_power takes from a first pass over the same events, replayed
+    from the saved state of their stream.
+
+    normalize selects how the WAV is scaled:
+      'two-pass'  record the peak in a sidecar (dat_path + '.peak.json')
+                  while writing dat_path, then write the WAV from a memmap
+                  of it; same level as the in-memory path
+      'headroom'  write dat_path and the WAV together at a fixed level from
+                  headroom_peak; one pass, rare peaks beyond it are clipped
+    """
+    N = int(cfg.fs * cfg.dur_s)
+    event_rng = rng.spawn(1)[0]
+    state = event_rng.bit_generator.state
+    sig_pwr = run_signal_power(cfg, event_blocks(cfg, N, event_rng), N, chunk_size)
+    event_rng.bit_generator.state = state
+    awgn = AWGNStage(cfg.snr_db, rng, sig_pwr, np.dtype(cfg.noise_dtype), chunk_size)
+
+    def noisy_chunks(f):
+        for x in stream_events(cfg, event_blocks(cfg, N, event_rng), chunk_size):
+            awgn.process(x, out=x)
+            np.asarray(x, dtype=np.float32).tofile(f)
+            yield x
+
+    if normalize == 'headroom':
+        with open(dat_path, 'wb') as f:
+            write_wav_int16_chunks(wav_path, cfg.fs, noisy_chunks(f),
+                                   headroom_peak(1.0, awgn.noise_std))
+        return
+    if normalize != 'two-pass':
+        raise ValueError(f"unknown normalize mode: {normalize}")
+
+    peak = 0.0
+    with open(dat_path, 'wb') as f:
+        for x in noisy_chunks(f):
+            peak = max(peak, np.max(np.abs(x)))
+    write_peak_sidecar(dat_path, peak, N)
+
+    data = np.memmap(dat_path, dtype=np.float32, mode='r')
+    chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    write_wav_int16_chunks(wav_path, cfg.fs, chunks, read_peak_sidecar(dat_path))
 
 def main():
-    rng = np.random.default_rng(42)
+    parser = argparse.ArgumentParser(description='Meteor Echo Simulator')
+    parser.add_argument('--seed', type=int, default=42, help='RNG seed for reproducible runs')
+    parser.add_argument('--duration', type=float, default=None, help='Simulation length in seconds')
+    parser.add_argument('--stream', action='store_true',
+                        help='Generate and write in chunks (constant memory, no spectrogram)')
+    parser.add_argument('--chunk-size', type=int, default=65536, help='Samples per chunk in --stream mode')
+    parser.add_argument('--normalize', choices=['two-pass', 'headroom'], default='two-pass',
+                        help='WAV scaling in --stream mode')
+    parser.add_argument('--oscillator', choices=['exact', 'nco'], default='exact',
+                        help='Carrier from np.cos (float64) or the float32 NCO')
+    parser.add_argument('--shower-peak', type=float, default=None,
+                        help='Time in seconds of a Gaussian meteor shower peak (default: constant rate)')
+    parser.add_argument('--shower-width', type=float, default=2.0,
+                        help='Standard deviation of the shower peak in seconds')
+    parser.add_argument('--shower-rate', type=float, default=5.0,
+                        help='Events/s above the background rate at the shower peak')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='Sample type of the simulated signal')
+    parser.add_argument('--noise-dtype', choices=['float64', 'float32'], default=None,
+                        help='Precision of the generated noise (default: --dtype; float32 is faster)')
+    parser.add_argument('--signal-power', choices=['measured', 'analytic'], default='measured',
+                        help='SNR reference: measured signal power or the sum of event energies')
+    args = parser.parse_args()
+
+    rendering.select_backend()
+    rng = np.random.default_rng(args.seed)
     cfg = SimConfig()
+    cfg.oscillator = args.oscillator
+    cfg.dtype = args.dtype
+    cfg.noise_dtype = args.noise_dtype or args.dtype
+    cfg.signal_power = args.signal_power
+    if args.duration is not None:
+        cfg.dur_s = args.duration
+    if args.shower_peak is not None:
+        cfg.event_rate_fn, cfg.event_rate_hz = shower_rate(
+            cfg.event_rate_hz, args.shower_rate, args.shower_peak, args.shower_width)
+    if args.stream:
+        simulate_stream(cfg, rng, 'meteor_sim.dat', 'meteor_sim.wav', args.chunk_size,
+                        args.normalize)
+        return
+
     N = int(cfg.fs * cfg.dur_s)
-    t = np.arange(N) / cfg.fs
-    starts = poisson_event_times(cfg.event_rate_hz, cfg.dur_s, rng)
-    x = np.zeros(N, dtype=float)
-    for t0 in starts:
-        x += synth_event(cfg, t, t0, rng)
-    x = add_awgn(x, cfg.snr_db, rng)
-    np.asarray(x, dtype=np.float32).tofile('meteor_sim.dat')
+    x = np.zeros(N, dtype=cfg.dtype)
+    events = draw_events(cfg, N, rng.spawn(1)[0])  # the same events as --stream
+    for ev in events:
+        render_event(cfg, ev, x)
+    sig_pwr = signal_power(x) if cfg.signal_power == 'measured' else run_signal_power(cfg, [events], N)
+    add_awgn(x, cfg.snr_db, rng, sig_pwr, out=x, dtype=np.dtype(cfg.noise_dtype))
+    write_dat_float32('meteor_sim.dat', x)
     write_wav_int16('meteor_sim.wav', cfg.fs, x)
     plt.figure(figsize=(10, 5))
     plt.specgram(x, NFFT=cfg.nfft, Fs=cfg.fs, noverlap=cfg.noverlap)
@@ -110,6 +394,7 @@ def main():
     plt.title('Simulated Meteor Echoes (underdense & overdense, doppler bending)')
     plt.tight_layout()
     plt.savefig('meteor_sim.png', dpi=150)
+    plt.close()
 
 if __name__ == '__main__':
     main()
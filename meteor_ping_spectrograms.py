@@ -2,39 +2,78 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
-
-def generate_single_ping(duration, sample_rate, center_freq, doppler_shift,
-                         amplitude_decay, noise_level, start_time, total_duration):
-    """
-    Generate a single meteor ping event placed at a given start time
-    """
-    n_total = int(sample_rate * total_duration)
-    signal = np.zeros(n_total)
-
+import rendering
+from echo_models import ping_profiles, ping_carrier
+
+# Per-ping parameters for generate_pings
+PING_PARAMS_DTYPE = np.dtype([
+    ('start_time', 'f8'),
+    ('duration', 'f8'),
+    ('center_freq', 'f8'),
+    ('doppler_shift', 'f8'),
+    ('amplitude_decay', 'f8'),
+    ('noise_level', 'f8'),
+])
+
+def synthesize_ping(duration, sample_rate, center_freq, doppler_shift,
+                    amplitude_decay, noise_level, rng, oscillator='exact',
+                    dtype=np.float64):
+    """One normalized meteor ping of dtype, int(sample_rate * duration) samples long"""
     t = np.linspace(0, duration, int(sample_rate * duration))
 
-    # Exponential amplitude decay (simulating trail dissipation)
-    amplitude = np.exp(-t / amplitude_decay)
-
-    # Time-varying Doppler shift (simulating trail evolution)
-    doppler = doppler_shift * np.exp(-t / (duration * 0.5))
+    amplitude, doppler = ping_profiles(t, duration, doppler_shift, amplitude_decay)
 
     # Generate the ping
-    ping = amplitude * np.sin(2 * np.pi * (center_freq + doppler) * t)
+    ping = (amplitude * ping_carrier(t, center_freq, doppler, sample_rate, oscillator)).astype(dtype, copy=False)
 
     # Add noise
-    ping += noise_level * np.random.randn(len(ping))
+    ping += noise_level * rng.standard_normal(len(ping), dtype=dtype)
 
     # Normalize
     ping = 0.9 * ping / np.max(np.abs(ping))
 
-    # Insert ping into overall signal
-    start_idx = int(start_time * sample_rate)
-    end_idx = min(start_idx + len(ping), n_total)
-    signal[start_idx:end_idx] = ping[:end_idx - start_idx]
+    return ping
 
+def add_ping(signal, ping, start_idx):
+    """Add ping into signal in place from start_idx, dropping what runs past the end"""
+    end_idx = max(min(start_idx + len(ping), len(signal)), start_idx)
+    signal[start_idx:end_idx] += ping[:end_idx - start_idx]
     return signal
 
+def generate_single_ping(duration, sample_rate, center_freq, doppler_shift,
+                         amplitude_decay, noise_level, start_time, total_duration,
+                         seed=None, oscillator='exact', out=None, dtype=np.float64):
+    """
+    Generate a single meteor ping event placed at a given start time, added into out if given
+    """
+    rng = np.random.default_rng(seed)
+    ping = synthesize_ping(duration, sample_rate, center_freq, doppler_shift,
+                           amplitude_decay, noise_level, rng, oscillator, dtype)
+
+    if out is None:
+        out = np.zeros(int(sample_rate * total_duration), dtype=dtype)
+    return add_ping(out, ping, int(start_time * sample_rate))
+
+def generate_pings(params, sample_rate, total_duration, seed=None,
+                   oscillator='exact', out=None, dtype=np.float64):
+    """
+    Add every ping of a PING_PARAMS_DTYPE array into one signal
+
+    Each ping is synthesized at its own length and added in place at its
+    start time, so memory grows with the longest ping rather than with
+    len(params) * total_duration. Noise is drawn ping by ping in array
+    order, as generate_single_ping(out=...) would for each row in turn.
+    """
+    rng = np.random.default_rng(seed)
+    if out is None:
+        out = np.zeros(int(sample_rate * total_duration), dtype=dtype)
+    for p in params:
+        ping = synthesize_ping(p['duration'], sample_rate, p['center_freq'],
+                               p['doppler_shift'], p['amplitude_decay'],
+                               p['noise_level'], rng, oscillator, dtype)
+        add_ping(out, ping, int(p['start_time'] * sample_rate))
+    return out
+
 def main():
     parser = argparse.ArgumentParser(description='Meteor Shower Simulator (Spectrogram output)')
     parser.add_argument('--duration', type=float, default=10.0, help='Total simulation duration in seconds')
@@ -42,12 +81,16 @@ def main():
     parser.add_argument('--freq', type=float, default=1000, help='Center frequency in Hz')
     parser.add_argument('--doppler', type=float, default=200, help='Maximum Doppler shift in Hz')
     parser.add_argument('--events', type=int, default=10, help='Number of meteor pings to simulate')
+    parser.add_argument('--seed', type=int, default=None, help='RNG seed for reproducible runs')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='Sample type of the simulated signal')
     
     args = parser.parse_args()
+    rendering.select_backend()
     sr = 44100
-    total_signal = np.zeros(int(sr * args.duration))
+    total_signal = np.zeros(int(sr * args.duration), dtype=args.dtype)
 
-    rng = np.random.default_rng()
+    rng = np.random.default_rng(args.seed)
 
     for _ in range(args.events):
         # Randomize each event
@@ -57,8 +100,8 @@ def main():
         decay = rng.uniform(0.1, 0.8)                   # exponential decay constant
         noise_level = rng.uniform(0.02, 0.1)
 
-        # Add ping to signal
-        total_signal += generate_single_ping(
+        # Add ping to signal in place
+        generate_single_ping(
             duration=ping_dur,
             sample_rate=sr,
             center_freq=args.freq,
@@ -66,7 +109,10 @@ def main():
             amplitude_decay=decay,
             noise_level=noise_level,
             start_time=start_time,
-            total_duration=args.duration
+            total_duration=args.duration,
+            seed=rng,
+            out=total_signal,
+            dtype=args.dtype
         )
 
     # Plot spectrogram
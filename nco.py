@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import numpy as np
+from functools import lru_cache
+
+# Fractional bits of the integer phase accumulator used with per-sample frequencies
+PHASE_BITS = 32
+
+@lru_cache(maxsize=None)
+def _lookup_tables(table_bits):
+    """exp(2j*pi*k/2**table_bits) as complex64, plus its real and imaginary parts"""
+    lut = np.exp(2j * np.pi * np.arange(1 << table_bits) / (1 << table_bits))
+    return {
+        'complex': lut.astype(np.complex64),
+        'cos': lut.real.astype(np.float32),
+        'sin': lut.imag.astype(np.float32),
+    }
+
+class NCO:
+    """
+    Numerically controlled oscillator producing float32 carriers block by block
+
+    The phase is kept between calls, so consecutive calls continue the same
+    carrier. At a constant frequency each block is the current phasor times a
+    precomputed table of exp(2j*pi*f*k/fs); the phasor is advanced by one
+    block per step and renormalized to unit magnitude every renorm_every
+    blocks. With a per-sample frequency the phase is integrated in a fixed
+    point accumulator and looked up in a 2**table_bits entry table (spurs
+    near -6*table_bits dBc).
+    """
+    def __init__(self, sample_rate, freq=0.0, phase=0.0, block_size=4096,
+                 renorm_every=16, table_bits=16):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.renorm_every = renorm_every
+        self._cycles = (phase / (2 * np.pi)) % 1.0
+        self._shift = PHASE_BITS - table_bits
+        self._mask = (1 << table_bits) - 1
+        self._luts = _lookup_tables(table_bits)
+        self.set_freq(freq)
+
+    @property
+    def phase(self):
+        """Phase of the next sample in radians, in [0, 2*pi)"""
+        return 2 * np.pi * self._cycles
+
+    def reset(self, phase=0.0):
+        self._cycles = (phase / (2 * np.pi)) % 1.0
+
+    def set_freq(self, freq):
+        """Change the constant frequency; the phase carries on from where it is"""
+        self.freq = freq
+        self._table = None  # built by the first constant-frequency call
+
+    def _rotate(self, n):
+        if self._table is None:
+            w = 2 * np.pi * self.freq / self.sample_rate
+            self._table = np.exp(1j * w * np.arange(self.block_size)).astype(np.complex64)
+            self._block_step = np.exp(1j * w * self.block_size)
+        out = np.empty(n, dtype=np.complex64)
+        phasor = np.exp(2j * np.pi * self._cycles)
+        for i, b0 in enumerate(range(0, n, self.block_size)):
+            b1 = min(b0 + self.block_size, n)
+            np.multiply(self._table[:b1 - b0], np.complex64(phasor), out=out[b0:b1])
+            phasor *= self._block_step
+            if (i + 1) % self.renorm_every == 0:
+                phasor /= abs(phasor)
+        self._cycles = (self._cycles + n * (self.freq / self.sample_rate)) % 1.0
+        return out
+
+    def _lookup(self, freq, kind):
+        # Integer phase accumulator: PHASE_BITS fractional bits of a cycle,
+        # the top table_bits of which index the table
+        lut = self._luts[kind]
+        n = len(freq)
+        out = np.empty(n, dtype=lut.dtype)
+        scale = (1 << PHASE_BITS) / self.sample_rate
+        acc = int(round(self._cycles * (1 << PHASE_BITS)))
+        half = 1 << (self._shift - 1)
+        step = np.empty(min(self.block_size, n))
+        for b0 in range(0, n, self.block_size):
+            b1 = min(b0 + self.block_size, n)
+            inc = np.multiply(freq[b0:b1], scale, out=step[:b1 - b0])
+            np.rint(inc, out=inc)
+            phase = inc.astype(np.int64)
+            phase[0] += acc + half  # half a table step rounds the index
+            np.cumsum(phase, out=phase)
+            acc = (int(phase[-1]) - half) & ((1 << PHASE_BITS) - 1)
+            phase >>= self._shift
+            phase &= self._mask
+            np.take(lut, phase, out=out[b0:b1])
+        self._cycles = acc / (1 << PHASE_BITS)
+        return out
+
+    def _generate(self, n, freq, kind):
+        if freq is not None:
+            return self._lookup(np.asarray(freq), kind)
+        out = self._rotate(n)
+        if kind == 'complex':
+            return out
+        return (out.real if kind == 'cos' else out.imag).copy()
+
+    def complex(self, n=None, freq=None):
+        """
+        Next n samples of exp(1j*phase) as complex64
+
+        Without freq the constant frequency is used and sample 0 carries the
+        current phase. freq is an array of per-sample frequencies in Hz,
+        freq[k] being the frequency over the step into sample k (so sample 0
+        is already advanced by freq[0]); n defaults to len(freq).
+        """
+        return self._generate(n, freq, 'complex')
+
+    def cos(self, n=None, freq=None):
+        """Real part of complex(), as float32"""
+        return self._generate(n, freq, 'cos')
+
+    def sin(self, n=None, freq=None):
+        """Imaginary part of complex(), as float32"""
+        return self._generate(n, freq, 'sin')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+import numpy as np
+import matplotlib
+import matplotlib.image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+NON_INTERACTIVE_BACKENDS = ('agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template')
+
+def display_available():
+    """True unless running on an X11/Wayland platform without a display"""
+    if sys.platform.startswith(('linux', 'freebsd', 'openbsd', 'netbsd')):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
+def select_backend(headless=None):
+    """
+    Switch matplotlib to Agg when headless is True, or when it is None and
+    no display is available (an explicit MPLBACKEND is left alone).
+    Returns the backend in use.
+    """
+    if headless is None:
+        headless = not os.environ.get('MPLBACKEND') and not display_available()
+    if headless:
+        matplotlib.use('Agg')
+    return matplotlib.get_backend()
+
+def is_interactive():
+    return matplotlib.get_backend().lower() not in NON_INTERACTIVE_BACKENDS
+
+def show(fig=None):
+    """plt.show() on an interactive backend; otherwise just release the figure"""
+    import matplotlib.pyplot as plt
+    if is_interactive():
+        plt.show()
+    else:
+        plt.close(fig if fig is not None else 'all')
+
+def save_spectrogram_image(filename, spectrogram_db, freq_axis=None, fmax=None,
+                           cmap='viridis', vmin=None, vmax=None):
+    """
+    Write a precomputed dB spectrogram straight to an image file, one pixel
+    per (frame, bin), low frequencies at the bottom; no figure or axes
+    """
+    if fmax is not None and freq_axis is not None:
+        spectrogram_db = spectrogram_db[:np.searchsorted(freq_axis, fmax, side='right')]
+    matplotlib.image.imsave(filename, spectrogram_db, cmap=cmap, vmin=vmin, vmax=vmax,
+                            origin='lower')
+
+class SpectrogramRenderer:
+    """
+    Off-screen Agg figure for precomputed dB spectrograms
+
+    The figure, axes, image and colorbar are built on the first render and
+    only updated afterwards, so rendering many files does not pay for
+    figure construction each time. Never shown, so safe on headless hosts.
+    """
+    def __init__(self, figsize=(12, 8), cmap='viridis', fmax=5000, dpi=150):
+        self.figsize = figsize
+        self.cmap = cmap
+        self.fmax = fmax
+        self.dpi = dpi
+        self.fig = None
+
+    def _build(self, spectrogram_db, extent):
+        self.fig = Figure(figsize=self.figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.im = self.ax.imshow(spectrogram_db, aspect='auto', origin='lower',
+                                 extent=extent, cmap=self.cmap)
+        self.fig.colorbar(self.im, ax=self.ax, label='Intensity (dB)')
+        self.ax.set_xlabel('Time (seconds)')
+        self.ax.set_ylabel('Frequency (Hz)')
+        self.ax.grid(True, alpha=0.3)
+
+    def render(self, spectrogram_db, time_axis, freq_axis, title, filename):
+        extent = [time_axis[0], time_axis[-1], freq_axis[0], freq_axis[-1]]
+        if self.fig is None:
+            self._build(spectrogram_db, extent)
+        else:
+            self.im.set_data(spectrogram_db)
+            self.im.set_extent(extent)
+            self.im.autoscale()
+        self.ax.set_title(title)
+        self.ax.set_xlim(extent[0], extent[1])
+        self.ax.set_ylim(0, self.fmax)
+        self.fig.savefig(filename, dpi=self.dpi, bbox_inches='tight')
+        return self.fig
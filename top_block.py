@@ -24,6 +24,7 @@ from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 import numpy as np
+import top_block_epy_block_0 as epy_block_0  # embedded python block
 import sip
 
 
@@ -90,7 +91,7 @@ class top_block(gr.top_block, Qt.QWidget):
         self.top_layout.addWidget(self._qtgui_sink_x_0_win)
         self.freq_xlating_fir_filter_xxx_0 = filter.freq_xlating_fir_filter_ccc(1, [1], 400, samp_rate)
         self.freq_xlating_fir_filter_xxx_0.set_block_alias("doppler_shift")
-        self.blocks_vector_source_x_0 = blocks.vector_source_c(([0.0]*100000 + [np.exp(-x/20000.0) for x in range(10000)] + [0.0]*100000), True, 1, [])
+        self.epy_block_0 = epy_block_0.blk(samp_rate=samp_rate, interval=0.21, envelope=np.exp(-np.arange(10000)/20000.0), poisson=True, seed=None)
         self.blocks_multiply_xx_0 = blocks.multiply_vcc(1)
         self.blocks_add_xx_0 = blocks.add_vcc(1)
         self.analog_sig_source_x_0 = analog.sig_source_c(samp_rate, analog.GR_SIN_WAVE, center_freq, 1, 0, 0)
@@ -106,7 +107,7 @@ class top_block(gr.top_block, Qt.QWidget):
         self.connect((self.analog_sig_source_x_0, 0), (self.blocks_multiply_xx_0, 0))
         self.connect((self.blocks_add_xx_0, 0), (self.qtgui_sink_x_0, 0))
         self.connect((self.blocks_multiply_xx_0, 0), (self.freq_xlating_fir_filter_xxx_0, 0))
-        self.connect((self.blocks_vector_source_x_0, 0), (self.blocks_multiply_xx_0, 1))
+        self.connect((self.epy_block_0, 0), (self.blocks_multiply_xx_0, 1))
         self.connect((self.freq_xlating_fir_filter_xxx_0, 0), (self.blocks_add_xx_0, 2))
 
 
@@ -124,6 +125,7 @@ class top_block(gr.top_block, Qt.QWidget):
     def set_samp_rate(self, samp_rate):
         self.samp_rate = samp_rate
         self.analog_sig_source_x_0.set_sampling_freq(self.samp_rate)
+        self.epy_block_0.samp_rate = self.samp_rate
         self.qtgui_sink_x_0.set_frequency_range(49.97e6, self.samp_rate)
 
     def get_center_freq(self):
@@ -0,0 +1,31 @@
+import numpy as np
+from gnuradio import gr
+from echo_models import BurstTrain
+
+class blk(gr.sync_block):
+    """Meteor burst envelopes at Poisson arrival times, zeros in between"""
+
+    def __init__(self, samp_rate=48000, interval=10.0, envelope=(1.0,),
+                 poisson=True, seed=None):
+        gr.sync_block.__init__(
+            self,
+            name='Meteor Burst Source',
+            in_sig=None,
+            out_sig=[np.complex64]
+        )
+        self.samp_rate = samp_rate
+        self.interval  = interval         # mean time between onsets, seconds
+        self.envelope  = envelope         # one burst, without leading zeros
+        self.poisson   = poisson          # False: an onset every interval seconds
+        self._train    = BurstTrain(samp_rate, interval, envelope, poisson, seed)
+        self._envelope = envelope         # the envelope the train was given
+
+    def work(self, input_items, output_items):
+        # Pick up values assigned by the flowgraph's setters
+        train = self._train
+        train.samp_rate = self.samp_rate
+        train.interval  = self.interval
+        train.poisson   = self.poisson
+        if self.envelope is not self._envelope:
+            train.envelope = self._envelope = self.envelope
+        return train.fill(output_items[0])